@@ -3,44 +3,86 @@ import logging
 import os
 import random
 import sys
+import time
+from collections import defaultdict
 from threading import Thread
 from typing import List, Dict
 
+import numpy
+
 from SuperMerchant import SuperMerchant
 from apiabstraction import ApiAbstraction
 from merchant_sdk.models import Offer, Product
 from ml_engine import MlEngine
 from training_data import TrainingData
-from utils.feature_extractor import extract_features
+from utils.feature_extractor import extract_features_for_prices, average_sale_price
+from utils.history_store import HistoryStore
+from utils.model_store import ModelStore
 from utils.performance_calculator import PerformanceCalculator
+from utils.prediction_cache import PredictionCache
+from utils.price_optimizer import PriceOptimizer, create_price_optimizer
 from utils.prices import PriceUtils
-from utils.utils import save_training_data, load_history
+from utils.recency_weighting import create_recency_weighting
+from utils.utils import load_history
+
+PRICING_CHUNK_SIZE = 10  # offers priced together before the pricing deadline is checked again
 
 
 class MLMerchant(SuperMerchant):
-    def __init__(self, settings, ml_engine: MlEngine, api: ApiAbstraction = None):
+    def __init__(self, settings, ml_engine: MlEngine, api: ApiAbstraction = None, price_optimizer: PriceOptimizer = None):
         super().__init__(settings, api)
         self.last_learning = None
+        self.learning_thread: Thread = None  # the only thread updating the training data and models after the initial learning
         self.ml_engine: MlEngine = ml_engine
         self.performance_calculator = PerformanceCalculator(ml_engine, self.merchant_id)
         self.training_data: TrainingData = None
+        self.history = HistoryStore(settings["data_file"] + '.history') if settings["data_file"] else None
+        self.model_store = ModelStore(settings["data_file"] + '.models') if settings["data_file"] else None
+        self.trained_watermark: dict = None  # of the training data the current models were trained on
         self.priceutils = PriceUtils()
+        self.price_optimizer: PriceOptimizer = price_optimizer  # created from the settings if not given
+        self.prediction_cache = PredictionCache(settings["prediction_cache_size"])
+        self.recency_weighting = create_recency_weighting(settings)
+        self.overdue_offer_ids = set()  # offers which missed the pricing deadline in the last tick
+        self.deadline_misses = 0
 
     def initialize(self):
-        if self.settings["data_file"] and os.path.isfile(self.settings["data_file"]):
+        if self.history and (self.history.exists() or os.path.isfile(self.settings["data_file"])):
+            self.load_saved_models()
             self.update_machine_learning()
         else:
             self.initial_learning()
 
         self.run_logic_loop()
 
+    def stop(self):
+        super().stop()
+        self.ml_engine.close()
+
     def update_machine_learning(self):
-        thread = Thread(target=self.machine_learning_worker)
-        thread.start()
+        if self.learning_thread and self.learning_thread.is_alive():
+            logging.debug('The machine learning worker is still running, the next update is skipped')
+            return
+        self.learning_thread = Thread(target=self.machine_learning_worker)
+        self.learning_thread.start()
+
+    def load_saved_models(self):
+        """
+        Serves the models of the last run until the training data was updated and, if it changed, the models retrained
+        """
+        self.training_data = self.load_training_data()
+        self.trained_watermark = self.model_store.load(self.ml_engine)
+        if self.trained_watermark is not None:
+            self.last_learning = datetime.datetime.now()
+            logging.debug('Restored the saved models')
 
     def machine_learning_worker(self):
         self.load_and_update_training_data()
-        self.perform_learning()
+        if self.training_data.watermark() == self.trained_watermark:
+            logging.debug('No new training data, the models are not retrained')
+            self.last_learning = datetime.datetime.now()
+        else:
+            self.perform_learning()
         self.performance_calculator.calc_performance(self.training_data, self.merchant_id)
 
     def initial_learning(self):
@@ -50,22 +92,51 @@ class MLMerchant(SuperMerchant):
         logging.debug('Setup done. Starting merchant...')
 
     def perform_learning(self):
-        self.ml_engine.train_model(self.training_data.convert_training_data())
-        self.ml_engine.train_universal_model(self.training_data.convert_training_data(True))
+        watermark = self.training_data.watermark()
+        training_data = self.training_data.convert_training_data(recency_weighting=self.recency_weighting,
+                                                                 aggregate_rows=self.settings["aggregate_training_rows"])
+        self.ml_engine.train_model(training_data)
+        self.ml_engine.train_universal_model(TrainingData.select_universal_features(training_data))
+        logging.debug('Prediction cache: {} hits, {} misses, hit rate {:.2f}'.format(
+            self.prediction_cache.hits, self.prediction_cache.misses, self.prediction_cache.hit_rate))
+        self.prediction_cache.clear()
         self.last_learning = datetime.datetime.now()
+        self.trained_watermark = watermark
+        if self.model_store:
+            self.model_store.save(self.ml_engine, watermark)
 
     def create_training_data(self):
         self.training_data = TrainingData(self.merchant_token, self.merchant_id)
+        self.training_data.price_half_life = self.settings["average_price_half_life"]
         self.training_data.append_by_csvs(self.settings['market_situation_csv_path'],
                                           self.settings['buy_offer_csv_path'],
                                           self.settings["initial_merchant_id"])
-        save_training_data(self.training_data, self.settings["data_file"])
+        self.evict_training_data()
+        self.save_training_data()
 
     def load_and_update_training_data(self):
-        self.training_data = load_history(self.settings["data_file"])
+        if self.training_data is None:
+            self.training_data = self.load_training_data()
         self.training_data.merchant_token = self.merchant_token
-        self.training_data.append_by_kafka(self.settings["kafka_reverse_proxy_url"])
-        save_training_data(self.training_data, self.settings["data_file"])
+        self.training_data.price_half_life = self.settings["average_price_half_life"]
+        self.training_data.append_by_kafka(self.settings["kafka_reverse_proxy_url"], incremental=self.settings["incremental_kafka_refresh"])
+        self.evict_training_data()
+        self.save_training_data()
+
+    def load_training_data(self) -> TrainingData:
+        if self.history.exists():
+            return self.history.load()
+        # migrate a pickled data file, the next save writes the history
+        return load_history(self.settings["data_file"])
+
+    def save_training_data(self):
+        if self.history:
+            self.history.save(self.training_data)
+
+    def evict_training_data(self):
+        evicted = self.training_data.evict(self.settings["retention_minutes"], self.settings["max_situations_per_product"])
+        if evicted > 0:
+            logging.debug('Evicted {} market situations'.format(evicted))
 
     def execute_logic(self):
         self.perform_learning_if_necessary()
@@ -75,6 +146,7 @@ class MLMerchant(SuperMerchant):
         offers = self.api.get_offers()
         own_offers = [offer for offer in offers if offer.merchant_id == self.merchant_id]
         own_offers_by_uid = {offer.uid: offer for offer in own_offers}
+        offers_by_product = self.index_offers_by_product(offers)
         missing_offers = self.settings["max_amount_of_offers"] - sum(offer.amount for offer in own_offers)
 
         # buy new products
@@ -82,8 +154,8 @@ class MLMerchant(SuperMerchant):
         product_prices_by_uid = self.get_product_prices()
 
         # handle bought products and either add them to existing offers or create new ones
-        self.update_existing_offers(offers, own_offers, product_prices_by_uid)
-        self.process_bought_products(new_products, offers, own_offers_by_uid, product_prices_by_uid)
+        self.update_existing_offers(offers_by_product, own_offers, product_prices_by_uid)
+        self.process_bought_products(new_products, offers_by_product, own_offers_by_uid, product_prices_by_uid)
 
         return max(1.0, self.api.request_counter) / self.settings["max_req_per_sec"]
 
@@ -91,16 +163,23 @@ class MLMerchant(SuperMerchant):
         products = self.api.get_products()
         return {product.uid: product.price for product in products}
 
-    def process_bought_products(self, new_products: List[Product], offers: List[Offer], own_offers_by_uid: dict, product_prices_by_uid: dict):
+    @staticmethod
+    def index_offers_by_product(offers: List[Offer]) -> Dict[str, List[Offer]]:
+        offers_by_product = defaultdict(list)
+        for offer in offers:
+            offers_by_product[offer.product_id].append(offer)
+        return offers_by_product
+
+    def process_bought_products(self, new_products: List[Product], offers_by_product: Dict[str, List[Offer]], own_offers_by_uid: dict, product_prices_by_uid: dict):
         for product in new_products:
-            self.process_bought_product(offers, own_offers_by_uid, product, product_prices_by_uid)
+            self.process_bought_product(offers_by_product, own_offers_by_uid, product, product_prices_by_uid)
 
-    def process_bought_product(self, offers, own_offers_by_uid, product, product_prices_by_uid):
+    def process_bought_product(self, offers_by_product, own_offers_by_uid, product, product_prices_by_uid):
         try:
             if product.uid in own_offers_by_uid:
-                self.update_existing_offer(offers, own_offers_by_uid, product, product_prices_by_uid)
+                self.update_existing_offer(offers_by_product.get(product.product_id, []), own_offers_by_uid, product, product_prices_by_uid)
             else:
-                self.create_new_offer(offers, product, product_prices_by_uid)
+                self.create_new_offer(offers_by_product.get(product.product_id, []), product, product_prices_by_uid)
         except Exception as e:
             print('could not handle product:', product, e)
 
@@ -121,14 +200,17 @@ class MLMerchant(SuperMerchant):
         offer.price = self.calculate_optimal_price(product_prices_by_uid, offer, product.uid, current_offers=offers)
         self.api.update_offer(offer)
 
-    def update_existing_offers(self, offers: List[Offer], own_offers: List[Offer], product_prices_by_uid: dict):
-        for own_offer in own_offers:
-            if own_offer.amount > 0:
-                # only update an existing offer, when new price is different from existing one
-                old_price = own_offer.price
-                own_offer.price = self.calculate_optimal_price(product_prices_by_uid, own_offer, own_offer.uid, current_offers=offers)
-                if float(own_offer.price) != float(old_price):
-                    self.api.update_offer(own_offer)
+    def update_existing_offers(self, offers_by_product: Dict[str, List[Offer]], own_offers: List[Offer], product_prices_by_uid: dict):
+        offers_to_update = [own_offer for own_offer in own_offers if own_offer.amount > 0]
+        # offers which missed the pricing deadline in the last tick are priced first
+        offers_to_update.sort(key=lambda offer: offer.offer_id not in self.overdue_offer_ids)
+        new_prices = self.calculate_optimal_prices_until_deadline(product_prices_by_uid, offers_to_update, offers_by_product)
+        for own_offer, new_price in zip(offers_to_update, new_prices):
+            # only update an existing offer, when new price is different from existing one
+            old_price = own_offer.price
+            own_offer.price = new_price
+            if float(own_offer.price) != float(old_price):
+                self.api.update_offer(own_offer)
 
     def buy_new_products(self, missing_offers: int):
         new_products = []
@@ -146,52 +228,156 @@ class MLMerchant(SuperMerchant):
 
     def calculate_optimal_price(self, product_prices_by_uid: dict, own_offer: Offer, uid, current_offers: List[Offer] = None):
         price = product_prices_by_uid[uid]
-        if random.uniform(0, 1) < 0.01 or self.training_data.number_marketsituations < self.settings["min_marketsituations"]:
+        if self.__use_random_price():
             print('r', end='')
             sys.stdout.flush()
             return self.priceutils.random_price(price)
         else:
             return self.highest_profit_from_ml(current_offers, own_offer, price)
 
+    def calculate_optimal_prices(self, product_prices_by_uid: dict, own_offers: List[Offer], offers_by_product: Dict[str, List[Offer]]) -> List[float]:
+        """
+        Calculates the prices of several own offers with one prediction per model
+        :param offers_by_product: current offers indexed by product_id, only the offers of the same product are competitors
+        :return: optimal prices in the same order as own_offers
+        """
+        optimal_prices = [None] * len(own_offers)
+        ml_indices = []
+        for i, own_offer in enumerate(own_offers):
+            price = product_prices_by_uid[own_offer.uid]
+            if self.__use_random_price():
+                print('r', end='')
+                optimal_prices[i] = self.priceutils.random_price(price)
+            else:
+                ml_indices.append(i)
+        sys.stdout.flush()
+
+        if ml_indices:
+            ml_prices = self.highest_profits_from_ml([offers_by_product[own_offers[i].product_id] for i in ml_indices],
+                                                     [own_offers[i] for i in ml_indices],
+                                                     [product_prices_by_uid[own_offers[i].uid] for i in ml_indices])
+            for i, ml_price in zip(ml_indices, ml_prices):
+                optimal_prices[i] = ml_price
+        return optimal_prices
+
+    def calculate_optimal_prices_until_deadline(self, product_prices_by_uid: dict, own_offers: List[Offer], offers_by_product: Dict[str, List[Offer]]) -> List[float]:
+        """
+        Calculates the prices of the own offers in chunks until the pricing deadline of the tick is reached.
+        Offers which are not priced in time keep their cached or current price.
+        :return: prices in the same order as own_offers
+        """
+        if self.settings["pricing_deadline"] <= 0:
+            return self.calculate_optimal_prices(product_prices_by_uid, own_offers, offers_by_product)
+
+        deadline = time.monotonic() + self.settings["pricing_deadline"]
+        new_prices = []
+        for start in range(0, len(own_offers), PRICING_CHUNK_SIZE):
+            if time.monotonic() >= deadline:
+                break
+            new_prices += self.calculate_optimal_prices(product_prices_by_uid, own_offers[start:start + PRICING_CHUNK_SIZE], offers_by_product)
+
+        overdue_offers = own_offers[len(new_prices):]
+        self.overdue_offer_ids = {offer.offer_id for offer in overdue_offers}
+        if overdue_offers:
+            self.deadline_misses += len(overdue_offers)
+            logging.warning('Pricing deadline missed for {} offers ({} in total)'.format(len(overdue_offers), self.deadline_misses))
+        for overdue_offer in overdue_offers:
+            new_prices.append(self.__cached_price(overdue_offer, offers_by_product[overdue_offer.product_id], product_prices_by_uid[overdue_offer.uid]))
+        return new_prices
+
+    def __cached_price(self, own_offer: Offer, current_offers: List[Offer], price: float):
+        cached_price = self.prediction_cache.peek(self.__fingerprint(own_offer, current_offers, price))
+        return cached_price.best_price if cached_price else own_offer.price
+
+    def __fingerprint(self, own_offer: Offer, current_offers: List[Offer], price: float):
+        return PredictionCache.fingerprint(own_offer, current_offers, price, average_sale_price(self.training_data.product_prices, own_offer.product_id),
+                                           self.ml_engine.model_version)
+
+    def __use_random_price(self):
+        return random.uniform(0, 1) < 0.01 or self.training_data.number_marketsituations < self.settings["min_marketsituations"]
+
     def highest_profit_from_ml(self, current_offers: List[Offer], own_offer: Offer, price: float):
+        return self.highest_profits_from_ml([current_offers], [own_offer], [price])[0]
+
+    def highest_profits_from_ml(self, current_offers_per_offer: List[List[Offer]], own_offers: List[Offer], prices: List[float]):
         try:
-            potential_prices = self.priceutils.get_potential_prices(price, False)
-            if str(own_offer.product_id) in self.ml_engine.product_model_dict:
-                probas = self.__highest_profit_from_product_model(current_offers, own_offer, potential_prices, price)
-            else:
-                probas = self.__highest_profit_from_universal_model(current_offers, own_offer, potential_prices, price)
-            expected_profits = self.priceutils.calculate_expected_profits(potential_prices, price, probas)
-            best_price = potential_prices[expected_profits.index(max(expected_profits))]
-            return best_price
+            best_prices = [None] * len(own_offers)
+            cache_keys = [self.__fingerprint(own_offer, current_offers, price)
+                          for current_offers, own_offer, price in zip(current_offers_per_offer, own_offers, prices)]
+            uncached_indices = []
+            for i, cache_key in enumerate(cache_keys):
+                cached_price = self.prediction_cache.get(cache_key)
+                if cached_price:
+                    best_prices[i] = cached_price.best_price
+                    print('c', end='')
+                else:
+                    uncached_indices.append(i)
+
+            current_offers_per_offer = [current_offers_per_offer[i] for i in uncached_indices]
+            own_offers = [own_offers[i] for i in uncached_indices]
+            prices = [prices[i] for i in uncached_indices]
+            price_optimizer = self.price_optimizer or create_price_optimizer(self.settings)
+            models = [self.__model_for_offer(own_offer) for own_offer in own_offers]
+            evaluated_prices_per_offer = [[] for _ in own_offers]
+            expected_profits_per_offer = [[] for _ in own_offers]
+
+            next_prices_per_offer = [price_optimizer.initial_prices(price, self.__get_competitor_prices(own_offer, current_offers))
+                                     for current_offers, own_offer, price in zip(current_offers_per_offer, own_offers, prices)]
+            search_round = 0
+            while any(next_prices_per_offer):
+                next_profits_per_offer = self.__calculate_expected_profits(current_offers_per_offer, own_offers, prices, models, next_prices_per_offer)
+                for i in range(len(own_offers)):
+                    evaluated_prices_per_offer[i] += next_prices_per_offer[i]
+                    expected_profits_per_offer[i] += next_profits_per_offer[i]
+                search_round += 1
+                next_prices_per_offer = [price_optimizer.next_prices(price, evaluated_prices, expected_profits, search_round)
+                                         for price, evaluated_prices, expected_profits in zip(prices, evaluated_prices_per_offer, expected_profits_per_offer)]
+
+            for i, model, evaluated_prices, expected_profits in zip(uncached_indices, models, evaluated_prices_per_offer, expected_profits_per_offer):
+                best_prices[i] = evaluated_prices[expected_profits.index(max(expected_profits))]
+                self.prediction_cache.put(cache_keys[i], best_prices[i], evaluated_prices, expected_profits)
+                print('U' if model is None else '.', end='')
+            sys.stdout.flush()
+            return best_prices
         except (KeyError, ValueError, AttributeError) as e:
             raise e
             # Fallback for new products
             print('R', end='')
             print(e)
             sys.stdout.flush()
-            return self.priceutils.random_price(price)
+            return [self.priceutils.random_price(price) for price in prices]
 
-    def __highest_profit_from_universal_model(self, current_offers, own_offer, potential_prices, price):
-        lst = self.__create_prediction_data(own_offer, current_offers, potential_prices, price, True)
-        probas = self.ml_engine.predict_with_universal_model(lst)
-        print('U', end='')
-        sys.stdout.flush()
-        return probas
+    @staticmethod
+    def __get_competitor_prices(own_offer: Offer, current_offers: List[Offer]):
+        return [offer.price for offer in current_offers if offer.offer_id != own_offer.offer_id]
 
-    def __highest_profit_from_product_model(self, current_offers, own_offer, potential_prices, price):
-        lst = self.__create_prediction_data(own_offer, current_offers, potential_prices, price, False)
-        probas = self.ml_engine.predict(str(own_offer.product_id), lst)
-        print('.', end='')
-        sys.stdout.flush()
-        return probas
-
-    def __create_prediction_data(self, own_offer: Offer, current_offers: List[Offer], potential_prices: List[int], price: float, universal_features: bool):
-        lst = []
-        for potential_price in potential_prices:
-            potential_price_candidate = potential_price / 10.0
-            potential_price = price + potential_price_candidate
-
-            setattr(next(offer for offer in current_offers if offer.offer_id == own_offer.offer_id), "price", potential_price)
-            prediction_data = extract_features(own_offer.offer_id, current_offers, universal_features, self.training_data.product_prices)
-            lst.append(prediction_data)
-        return lst
+    def __calculate_expected_profits(self, current_offers_per_offer: List[List[Offer]], own_offers: List[Offer], prices: List[float], models: List, potential_prices_per_offer: List[List[float]]):
+        """
+        Predicts the potential prices of all offers with one prediction per model
+        :return: expected profits per offer in the same order as own_offers
+        """
+        situations_by_model = defaultdict(list)
+        for current_offers, own_offer, model, potential_prices in zip(current_offers_per_offer, own_offers, models, potential_prices_per_offer):
+            if potential_prices:
+                situations_by_model[model].append(self.__create_prediction_data(own_offer, current_offers, potential_prices, model is None))
+        probas_by_model = self.ml_engine.predict_grouped({model: numpy.vstack(situations) for model, situations in situations_by_model.items()})
+
+        expected_profits_per_offer = []
+        position_by_model = defaultdict(int)
+        for model, potential_prices, price in zip(models, potential_prices_per_offer, prices):
+            position = position_by_model[model]
+            probas = probas_by_model[model][position:position + len(potential_prices)] if potential_prices else []
+            position_by_model[model] += len(potential_prices)
+            expected_profits_per_offer.append(self.priceutils.calculate_expected_profits(potential_prices, price, probas))
+        return expected_profits_per_offer
+
+    def __model_for_offer(self, own_offer: Offer):
+        """
+        :return: product id of the product model or None if the universal model has to be used
+        """
+        if str(own_offer.product_id) in self.ml_engine.product_model_dict:
+            return str(own_offer.product_id)
+        return None
+
+    def __create_prediction_data(self, own_offer: Offer, current_offers: List[Offer], potential_prices: List[float], universal_features: bool):
+        return extract_features_for_prices(own_offer.offer_id, current_offers, potential_prices, universal_features, self.training_data.product_prices)
@@ -0,0 +1,36 @@
+"""
+Compares RandomForestRegressor.predict with the ForestPredictor used by the RandomForestEngine
+
+Run from the merchant directory: python -m benchmarks.rand_for_inference
+"""
+from timeit import timeit
+
+import numpy
+from sklearn.ensemble import RandomForestRegressor
+
+from ml_engines.forest_predictor import ForestPredictor
+
+NUM_OF_FEATURES = 14
+NUM_OF_TRAINING_ROWS = 5000
+BATCH_SIZES = [30, 420, 4200]
+REPETITIONS = 30
+
+
+def main():
+    random_state = numpy.random.RandomState(42)
+    features = random_state.rand(NUM_OF_TRAINING_ROWS, NUM_OF_FEATURES)
+    sales = (random_state.rand(NUM_OF_TRAINING_ROWS) < features[:, 0]).astype(int)
+    forest = RandomForestRegressor(n_estimators=75, random_state=42).fit(features, sales)
+    predictor = ForestPredictor(forest)
+
+    print('{:>10} {:>15} {:>20} {:>10} {:>10}'.format('rows', 'sklearn [ms]', 'ForestPredictor [ms]', 'speedup', 'identical'))
+    for batch_size in BATCH_SIZES:
+        situations = random_state.rand(batch_size, NUM_OF_FEATURES)
+        sklearn_ms = timeit(lambda: forest.predict(situations), number=REPETITIONS) / REPETITIONS * 1000
+        predictor_ms = timeit(lambda: predictor.predict(situations), number=REPETITIONS) / REPETITIONS * 1000
+        identical = numpy.array_equal(forest.predict(situations), predictor.predict(situations))
+        print('{:>10} {:>15.2f} {:>20.2f} {:>10.1f} {:>10}'.format(batch_size, sklearn_ms, predictor_ms, sklearn_ms / predictor_ms, str(identical)))
+
+
+if __name__ == '__main__':
+    main()
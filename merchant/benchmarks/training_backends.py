@@ -0,0 +1,42 @@
+"""
+Compares the wall time of training the product models of the RandomForestEngine on the threads and processes backends
+
+Run from the merchant directory: python -m benchmarks.training_backends
+"""
+import os
+from timeit import timeit
+
+import numpy
+
+from ml_engines.rand_for import RandomForestEngine
+
+NUM_OF_FEATURES = 14
+NUM_OF_PRODUCTS = 8
+NUM_OF_TRAINING_ROWS = 3000  # per product
+WORKERS = [1, 2, 4, 8]
+REPETITIONS = 2
+
+
+def main():
+    random_state = numpy.random.RandomState(42)
+    features = dict()
+    for product_id in range(NUM_OF_PRODUCTS):
+        product_features = random_state.rand(NUM_OF_TRAINING_ROWS, NUM_OF_FEATURES)
+        product_sales = (random_state.rand(NUM_OF_TRAINING_ROWS) < product_features[:, 0]).astype(int)
+        features[str(product_id)] = (product_features, product_sales, numpy.ones(NUM_OF_TRAINING_ROWS))
+
+    print('{} cores, {} products of {} rows'.format(os.cpu_count(), NUM_OF_PRODUCTS, NUM_OF_TRAINING_ROWS))
+    print('{:>10} {:>15} {:>17} {:>10}'.format('workers', 'threads [s]', 'processes [s]', 'speedup'))
+    for workers in WORKERS:
+        threads = RandomForestEngine(training_backend='threads', training_workers=workers)
+        processes = RandomForestEngine(training_backend='processes', training_workers=workers)
+        # the worker processes are started by the first training
+        processes.train_model(features)
+        threads_s = timeit(lambda: threads.train_model(features), number=REPETITIONS) / REPETITIONS
+        processes_s = timeit(lambda: processes.train_model(features), number=REPETITIONS) / REPETITIONS
+        processes.close()
+        print('{:>10} {:>15.2f} {:>17.2f} {:>10.1f}'.format(workers, threads_s, processes_s, threads_s / processes_s))
+
+
+if __name__ == '__main__':
+    main()
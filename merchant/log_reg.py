@@ -8,13 +8,13 @@ from utils.settingsbuilder import SettingsBuilder
 
 class LogisticRegressionMerchant(AbstractMerchant):
     def get_cross_validator(self, settings):
-        return CrossValidator(settings, LogisticRegressionEngine())
+        return CrossValidator(settings, LogisticRegressionEngine(training_backend=settings["training_backend"], training_workers=settings["training_workers"]))
 
     def start_merchant(self):
         settings = SettingsBuilder() \
             .with_data_file('log_reg_models.pkl') \
             .build()
-        ml_merchant = MLMerchant(settings, LogisticRegressionEngine())
+        ml_merchant = MLMerchant(settings, LogisticRegressionEngine(training_backend=settings["training_backend"], training_workers=settings["training_workers"]))
         ml_merchant.initialize()
         return ml_merchant
 
@@ -1,3 +1,5 @@
+import shutil
+
 from.PricewarsBaseApi import PricewarsBaseApi
 
 
@@ -15,11 +17,12 @@ class KafkaApi(PricewarsBaseApi):
     def download_csv_for_topic(self, topic, local_filename):
         url = self._request_data_export(topic)
         r = self.request('get', url, stream=True)
+        if r is None or r.status_code != 200:
+            return False
+        # copy the decoded stream in 1 MB blocks instead of writing small chunks
+        r.raw.decode_content = True
         with open(local_filename, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=1024): 
-                if chunk: # filter out keep-alive new chunks
-                    f.write(chunk)
-                    #f.flush() commented by recommendation from J.F.Sebastian
+            shutil.copyfileobj(r.raw, f, 1 << 20)
         return True
 
     def request_csv_export_for_topic(self, topic):
@@ -1,12 +1,27 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
 from threading import Lock
-from typing import List
+from typing import List, Dict, Optional
+
+import numpy
+from sklearn.utils.validation import has_fit_parameter
+
+from utils.process_training import create_training_pool, fit_in_processes
 
 
 class MlEngine(ABC):
-    def __init__(self):
+    def __init__(self, training_backend: str = 'threads', training_workers: int = 8):
+        """
+        :param training_backend: threads or processes, the product models are fitted on a pool of either
+        :param training_workers: product models fitted in parallel
+        """
         self.product_model_dict = dict()
         self.universal_model = None
+        self.model_version = 0  # increased whenever a model is replaced
+        self.training_backend = training_backend
+        self.training_workers = training_workers
+        self.training_pool = None  # worker processes, started by the first training with the processes backend
+        self.training_pool_lock = Lock()  # held while the pool trains or is shut down
 
     @abstractmethod
     def train_model(self, features):
@@ -24,14 +39,104 @@ class MlEngine(ABC):
     def predict_with_universal_model(self, situations: List[List[int]]):
         pass
 
+    @abstractmethod
+    def create_product_model(self):
+        """
+        :return: unfitted model of a product
+        """
+        pass
+
+    def train_model_for_id(self, product_id, data):
+        product_model = self.create_product_model()
+        self.fit_weighted(product_model, *data)
+        self.set_product_model(product_id, product_model)
+
+    def train_product_models(self, features: dict):
+        """
+        Fits a model per product on the training backend
+        :param features: product_id -> (features, sales, weights)
+        """
+        if self.training_backend == 'processes':
+            with self.training_pool_lock:
+                if self.training_pool is None:
+                    self.training_pool = create_training_pool(self.training_workers)
+                models = {product_id: self.create_product_model() for product_id in features}
+                for product_id, product_model in fit_in_processes(self.training_pool, MlEngine.fit_weighted, models, features):
+                    self.set_product_model(product_id, product_model)
+        else:
+            with ThreadPoolExecutor(max_workers=self.training_workers) as executor:
+                wait([executor.submit(self.train_model_for_id, product_id, features[product_id]) for product_id in features])
+
+    def close(self):
+        """
+        Shuts down the worker processes of the processes backend after a running training finished,
+        the next training starts new ones
+        """
+        with self.training_pool_lock:
+            if self.training_pool is not None:
+                self.training_pool.shutdown()
+                self.training_pool = None
+
+    def predict_grouped(self, situations_by_product: Dict[Optional[str], List[List[int]]]):
+        """
+        Predicts the situations of several products with one prediction call per model
+        :param situations_by_product: product_id -> situations, None is used for the universal model
+        :return: product_id -> sales probabilities
+        """
+        probas = dict()
+        for product_id, situations in situations_by_product.items():
+            if product_id is None:
+                probas[product_id] = self.predict_with_universal_model(situations)
+            else:
+                probas[product_id] = self.predict(product_id, situations)
+        return probas
+
+    @staticmethod
+    def fit_weighted(model, features, sales, weights):
+        """
+        Fits the model with sample weights. Models without sample weight support are fitted on a resampled training set
+        that repeats every row by its weight, fractional weights are rounded up or down at random.
+        """
+        if has_fit_parameter(model, 'sample_weight'):
+            return model.fit(features, sales, sample_weight=weights)
+        repetitions = numpy.floor(weights).astype(int)
+        repetitions += numpy.random.random_sample(len(repetitions)) < weights - repetitions
+        return model.fit(numpy.repeat(features, repetitions, axis=0), numpy.repeat(sales, repetitions))
+
+    @staticmethod
+    def stack_training_data(features: dict):
+        """
+        :param features: product_id -> (features, sales, weights)
+        :return: features, sales and weights of all products for the universal model
+        """
+        product_features, product_sales, product_weights = zip(*features.values())
+        return numpy.vstack(product_features), numpy.concatenate(product_sales), numpy.concatenate(product_weights)
+
+    def restore_models(self, product_models: dict, universal_model):
+        """
+        Serves previously trained models, e.g. loaded by the ModelStore
+        :param product_models: product_id -> model
+        """
+        for product_id, product_model in product_models.items():
+            self.set_product_model(product_id, product_model)
+        self.set_universal_model_thread_safe(universal_model)
+
+    def set_product_model(self, product_id, product_model):
+        """
+        Serves a fitted product model. Engines deriving predictors from the models extend it.
+        """
+        self.set_product_model_thread_safe(product_id, product_model)
+
     def set_product_model_thread_safe(self, product_id, product_model):
         lock = Lock()
         lock.acquire()
         self.product_model_dict[product_id] = product_model
+        self.model_version += 1
         lock.release()
 
     def set_universal_model_thread_safe(self, universal_model):
         lock = Lock()
         lock.acquire()
         self.universal_model = universal_model
+        self.model_version += 1
         lock.release()
@@ -0,0 +1,24 @@
+from typing import List
+
+import numpy
+from sklearn.ensemble import RandomForestRegressor
+
+
+class ForestPredictor:
+    """
+    Predicts with the trees of a trained random forest directly, without the input validation and joblib
+    dispatching of RandomForestRegressor.predict, which dominate the prediction time of small batches.
+    Predictions are numerically identical to RandomForestRegressor.predict.
+    """
+
+    def __init__(self, forest: RandomForestRegressor):
+        self.trees = [estimator.tree_ for estimator in forest.estimators_]
+
+    def predict(self, situations: List[List[float]]):
+        # sklearn trees work on float32 features
+        features = numpy.ascontiguousarray(situations, dtype=numpy.float32)
+        predicted = numpy.zeros(features.shape[0])
+        # sum up tree by tree in the same order as sklearn to get identical floating point results
+        for tree in self.trees:
+            predicted += tree.predict(features)[:, 0]
+        return predicted / len(self.trees)
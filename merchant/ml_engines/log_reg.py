@@ -1,8 +1,9 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor, wait
 from time import time
 from typing import List
 
+import numpy
+from scipy.special import expit
 from sklearn.linear_model import LogisticRegression
 from sklearn.utils import shuffle
 
@@ -10,41 +11,62 @@ from ml_engine import MlEngine
 
 
 class LogisticRegressionEngine(MlEngine):
+    """
+    After training, the coefficients and intercepts of all product models are stacked into one matrix.
+    Sales probabilities are calculated in closed form (sigmoid of a dot product) instead of predict_proba.
+    """
+
+    def __init__(self, training_backend: str = 'threads', training_workers: int = 8):
+        super().__init__(training_backend, training_workers)
+        # (coefficients, intercepts, product_id -> row), replaced as a whole to stay consistent for predictions
+        self.stacked_product_models = (numpy.zeros((0, 0)), numpy.zeros(0), dict())
+        self.universal_coefficients = None
+
     def train_model(self, features):
         # TODO include time and amount of sold items to featurelist
         start_time = int(time() * 1000)
         logging.debug('Start training')
-        product_ids = features.keys()
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            thread_list = [executor.submit(self.train_model_for_id, product_id, features[product_id]) for product_id in product_ids]
-            wait(thread_list)
+        self.train_product_models(features)
+        self.stack_product_models()
         end_time = int(time() * 1000)
         logging.debug('Finished training')
         logging.debug('Training took {} ms'.format(end_time - start_time))
 
-    def train_model_for_id(self, product_id, data):
-        product_model = LogisticRegression(n_jobs=-1)
-        product_model.fit(data[0], data[1])
-        self.set_product_model_thread_safe(product_id, product_model)
+    def create_product_model(self):
+        return LogisticRegression()
 
     def train_universal_model(self, features: dict):
         logging.debug('Start training universal model')
         start_time = int(time() * 1000)
-        universal_model = LogisticRegression(n_jobs=-1)
-        f_vector = []
-        s_vector = []
-        for product_id, vector_tuple in features.items():
-            f_vector.extend(vector_tuple[0])
-            s_vector.extend(vector_tuple[1])
-        f, s = shuffle(f_vector, s_vector)
-        universal_model.fit(f, s)
+        universal_model = self.create_product_model()
+        f, s, w = shuffle(*self.stack_training_data(features))
+        self.fit_weighted(universal_model, f, s, w)
         end_time = int(time() * 1000)
         logging.debug('Finished training universal model')
         logging.debug('Training took {} ms'.format(end_time - start_time))
+        self.universal_coefficients = (universal_model.coef_[0].copy(), universal_model.intercept_[0])
         self.set_universal_model_thread_safe(universal_model)
 
+    def restore_models(self, product_models: dict, universal_model):
+        self.universal_coefficients = (universal_model.coef_[0].copy(), universal_model.intercept_[0])
+        super().restore_models(product_models, universal_model)
+        self.stack_product_models()
+
+    def stack_product_models(self):
+        product_ids = list(self.product_model_dict.keys())
+        if not product_ids:
+            return
+        coefficients = numpy.vstack([self.product_model_dict[product_id].coef_[0] for product_id in product_ids])
+        intercepts = numpy.array([self.product_model_dict[product_id].intercept_[0] for product_id in product_ids])
+        self.stacked_product_models = (coefficients, intercepts, {product_id: row for row, product_id in enumerate(product_ids)})
+
     def predict(self, product_id: str, situations: List[List[int]]):
-        return self.product_model_dict[product_id].predict_proba(situations)[:, 1]
+        coefficients, intercepts, rows = self.stacked_product_models
+        if product_id not in rows:
+            return self.product_model_dict[product_id].predict_proba(situations)[:, 1]
+        row = rows[product_id]
+        return expit(numpy.asarray(situations, dtype=float) @ coefficients[row] + intercepts[row])
 
     def predict_with_universal_model(self, situations: List[List[int]]):
-        return self.universal_model.predict_proba(situations)[:, 1]
+        coefficients, intercept = self.universal_coefficients
+        return expit(numpy.asarray(situations, dtype=float) @ coefficients + intercept)
@@ -1,5 +1,4 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor, wait
 from time import time
 from typing import List
 
@@ -11,42 +10,26 @@ from ml_engine import MlEngine
 class MlpEngine(MlEngine):
     def train_model(self, features: dict):
         logging.debug('Start training')
-        product_ids = features.keys()
         start_time = int(time() * 1000)
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            thread_list = [executor.submit(self.train_model_for_id, product_id, features[product_id]) for product_id in product_ids]
-            wait(thread_list)
+        self.train_product_models(features)
         end_time = int(time() * 1000)
         logging.debug('Finished training')
         logging.debug('Training took {} ms'.format(end_time - start_time))
 
-    def train_model_for_id(self, product_id, data):
-        product_model = MLPRegressor(hidden_layer_sizes=(5,),
-                                     activation='relu',
-                                     solver='adam',
-                                     learning_rate='adaptive',
-                                     max_iter=1000,
-                                     learning_rate_init=0.01,
-                                     alpha=0.01)
-        product_model.fit(data[0], data[1])
-        self.set_product_model_thread_safe(product_id, product_model)
+    def create_product_model(self):
+        return MLPRegressor(hidden_layer_sizes=(5,),
+                            activation='relu',
+                            solver='adam',
+                            learning_rate='adaptive',
+                            max_iter=1000,
+                            learning_rate_init=0.01,
+                            alpha=0.01)
 
     def train_universal_model(self, features: dict):
         logging.debug('Start training universal model')
-        universal_model = MLPRegressor(hidden_layer_sizes=(5,),
-                                       activation='relu',
-                                       solver='adam',
-                                       learning_rate='adaptive',
-                                       max_iter=1000,
-                                       learning_rate_init=0.01,
-                                       alpha=0.01)
+        universal_model = self.create_product_model()
         start_time = int(time() * 1000)
-        f_vector = []
-        s_vector = []
-        for product_id, vector_tuple in features.items():
-            f_vector.extend(vector_tuple[0])
-            s_vector.extend(vector_tuple[1])
-        universal_model.fit(f_vector, s_vector)
+        self.fit_weighted(universal_model, *self.stack_training_data(features))
         end_time = int(time() * 1000)
         logging.debug('Finished training universal model')
         logging.debug('Training took {} ms'.format(end_time - start_time))
@@ -1,49 +1,61 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor, wait
 from time import time
 from typing import List
 
+import numpy
 from sklearn.ensemble import RandomForestRegressor
 
 from ml_engine import MlEngine
+from ml_engines.forest_predictor import ForestPredictor
 
 
 class RandomForestEngine(MlEngine):
+    def __init__(self, fast_inference=True, training_backend: str = 'threads', training_workers: int = 8):
+        super().__init__(training_backend, training_workers)
+        self.fast_inference = fast_inference
+        self.product_predictor_dict = dict()
+        self.universal_predictor = None
+
     def train_model(self, features: dict):
         logging.debug('Start training')
-        product_ids = features.keys()
         start_time = int(time() * 1000)
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            thread_list = [executor.submit(self.train_model_for_id, product_id, features[product_id]) for product_id in product_ids]
-            wait(thread_list)
+        self.train_product_models(features)
         end_time = int(time() * 1000)
         logging.debug('Finished training')
         logging.debug('Training took {} ms'.format(end_time - start_time))
 
-    def train_model_for_id(self, product_id, data):
-        product_model = RandomForestRegressor(n_estimators=75)
-        product_model.fit(data[0], data[1])
-        self.set_product_model_thread_safe(product_id, product_model)
+    def create_product_model(self):
+        return RandomForestRegressor(n_estimators=75)
+
+    def set_product_model(self, product_id, product_model):
+        self.product_predictor_dict[product_id] = ForestPredictor(product_model)
+        super().set_product_model(product_id, product_model)
+
+    def restore_models(self, product_models: dict, universal_model):
+        self.universal_predictor = ForestPredictor(universal_model)
+        super().restore_models(product_models, universal_model)
 
     def predict(self, product_id: str, situations: List):
-        predicted = self.product_model_dict[product_id].predict(situations)
-        return [max(0.000001, min(predict, 0.999999)) for predict in predicted]
+        if self.fast_inference:
+            predicted = self.product_predictor_dict[product_id].predict(situations)
+        else:
+            predicted = self.product_model_dict[product_id].predict(situations)
+        return numpy.clip(predicted, 0.000001, 0.999999)
 
     def train_universal_model(self, features: dict):
         logging.debug('Start training universal model')
         start_time = int(time() * 1000)
-        universal_model = RandomForestRegressor(n_estimators=75)
-        f_vector = []
-        s_vector = []
-        for product_id, vector_tuple in features.items():
-            f_vector.extend(vector_tuple[0])
-            s_vector.extend(vector_tuple[1])
-        universal_model.fit(f_vector, s_vector)
+        universal_model = self.create_product_model()
+        self.fit_weighted(universal_model, *self.stack_training_data(features))
         end_time = int(time() * 1000)
         logging.debug('Finished training universal model')
         logging.debug('Training took {} ms'.format(end_time - start_time))
+        self.universal_predictor = ForestPredictor(universal_model)
         self.set_universal_model_thread_safe(universal_model)
 
     def predict_with_universal_model(self, situations: List[List[int]]):
-        predicted = self.universal_model.predict(situations)
-        return [max(0.000001, min(predict, 0.999999)) for predict in predicted]
+        if self.fast_inference:
+            predicted = self.universal_predictor.predict(situations)
+        else:
+            predicted = self.universal_model.predict(situations)
+        return numpy.clip(predicted, 0.000001, 0.999999)
@@ -8,13 +8,13 @@ from utils.settingsbuilder import SettingsBuilder
 
 class MlpMerchant(AbstractMerchant):
     def get_cross_validator(self, settings):
-        return CrossValidator(settings, MlpEngine())
+        return CrossValidator(settings, MlpEngine(training_backend=settings["training_backend"], training_workers=settings["training_workers"]))
 
     def start_merchant(self):
         settings = SettingsBuilder() \
             .with_data_file('mlp_models.pkl') \
             .build()
-        ml_merchant = MLMerchant(settings, MlpEngine())
+        ml_merchant = MLMerchant(settings, MlpEngine(training_backend=settings["training_backend"], training_workers=settings["training_workers"]))
         ml_merchant.initialize()
         return ml_merchant
 
@@ -13,7 +13,7 @@ class BuyOffer:
         self.product_id = None
         self.quality = None
         self.timestamp = None
-        self.timestamp_object = None
+        self.timestamp_ms = None
         self.uid = None
         if csv_row:
             self.from_csv(csv_row)
@@ -31,7 +31,7 @@ class BuyOffer:
         self.product_id = csv_row[7]
         self.quality = csv_row[8]
         self.timestamp = csv_row[9]
-        self.timestamp_object = TimestampConverter.from_string(self.timestamp)
+        self.timestamp_ms = TimestampConverter.to_epoch_ms(self.timestamp)
         self.uid = csv_row[10]
 
     def from_kafka(self, kafka_row):
@@ -45,7 +45,7 @@ class BuyOffer:
         self.product_id = kafka_row[8]
         self.quality = kafka_row[9]
         self.timestamp = kafka_row[10]
-        self.timestamp_object = TimestampConverter.from_string(self.timestamp)
+        self.timestamp_ms = TimestampConverter.to_epoch_ms(self.timestamp)
 
         # {'amount': row[1], 'consumer_id': row[2], 'left_in_stock': row[4], 'merchant_id': row[5], 'offer_id': row[6], 'price': row[7], 'product_id': row[8], 'quality': row[9],
         #  'timestamp': row[10]}
@@ -13,7 +13,7 @@ class MarketSituation:
         self.shipping_time_prime = None
         self.shipping_time_standard = None
         self.timestamp = None
-        self.timestamp_object = None
+        self.timestamp_ms = None
         self.triggering_merchant_id = None
         self.uid = None
 
@@ -33,7 +33,7 @@ class MarketSituation:
         self.shipping_time_prime = csv_row[7]
         self.shipping_time_standard = csv_row[8]
         self.timestamp = csv_row[9]
-        self.timestamp_object = TimestampConverter.from_string(self.timestamp)
+        self.timestamp_ms = TimestampConverter.to_epoch_ms(self.timestamp)
         self.triggering_merchant_id = csv_row[10]
         self.uid = csv_row[11]
 
@@ -48,5 +48,5 @@ class MarketSituation:
         self.shipping_time_prime = kafka_row[8]
         self.shipping_time_standard = kafka_row[9]
         self.timestamp = kafka_row[10]
-        self.timestamp_object = TimestampConverter.from_string(self.timestamp)
+        self.timestamp_ms = TimestampConverter.to_epoch_ms(self.timestamp)
         self.triggering_merchant_id = kafka_row[11]
@@ -8,13 +8,13 @@ from utils.settingsbuilder import SettingsBuilder
 
 class RandomForestMerchant(AbstractMerchant):
     def get_cross_validator(self, settings):
-        return CrossValidator(settings, RandomForestEngine())
+        return CrossValidator(settings, RandomForestEngine(training_backend=settings["training_backend"], training_workers=settings["training_workers"]))
 
     def start_merchant(self):
         settings = SettingsBuilder() \
             .with_data_file('rand_for_models.pkl') \
             .build()
-        ml_merchant = MLMerchant(settings, RandomForestEngine())
+        ml_merchant = MLMerchant(settings, RandomForestEngine(training_backend=settings["training_backend"], training_workers=settings["training_workers"]))
         ml_merchant.initialize()
         return ml_merchant
 
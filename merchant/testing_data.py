@@ -1,8 +1,7 @@
-import csv
 from merchant_sdk.models import Offer
 from models.joined_market_situation import JoinedMarketSituation
 from collections import defaultdict
-from utils.utils import get_market_situation_fieldnames
+from utils.utils import get_market_situation_fieldnames, read_csv_chunks
 
 
 class TestingData(object):
@@ -13,14 +12,8 @@ class TestingData(object):
         self.product_prices = defaultdict(list)
 
     def append_by_csvs(self, market_situations_path, csv_merchant_id):
-        with open(market_situations_path, 'r') as csvfile:
-            has_header = csv.Sniffer().has_header(csvfile.read(16384))
-            csvfile.seek(0)
-            if has_header:
-                situation_data = csv.DictReader(csvfile)
-            else:
-                situation_data = csv.DictReader(csvfile, fieldnames=get_market_situation_fieldnames())
-            for line in situation_data:
+        for chunk in read_csv_chunks(market_situations_path, get_market_situation_fieldnames()):
+            for line in chunk.to_dict('records'):
                 self.append_marketplace_situations(line, csv_merchant_id)
 
     def append_marketplace_situations(self, line, csv_merchant_id):
@@ -0,0 +1,60 @@
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+
+class ExportServer:
+    """
+    Local stand-in for the kafka reverse proxy: export/data/<topic> returns the url of the csv export of the topic,
+    the exports support range requests. The exports can be changed between requests.
+    """
+
+    def __init__(self):
+        self.exports = dict()  # topic -> csv text
+        self.requested_ranges = list()  # (topic, first requested byte)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.__create_handler())
+        self.url = 'http://127.0.0.1:{:d}'.format(self.server.server_port)
+
+    def start(self):
+        Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                topic = self.path.rsplit('/', 1)[-1].replace('.csv', '')
+                if self.path.startswith('/export/data/'):
+                    self.__respond(200, json.dumps({'url': 'exports/{}.csv'.format(topic)}).encode())
+                    return
+                content = server.exports.get(topic, '').encode()
+                requested_range = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+                if not requested_range:
+                    server.requested_ranges.append((topic, 0))
+                    self.__respond(200, content)
+                    return
+                start = int(requested_range.group(1))
+                server.requested_ranges.append((topic, start))
+                if start >= len(content):
+                    self.__respond(416, b'', {'Content-Range': 'bytes */{:d}'.format(len(content))})
+                else:
+                    self.__respond(206, content[start:], {'Content-Range': 'bytes {:d}-{:d}/{:d}'.format(start, len(content) - 1, len(content))})
+
+            def __respond(self, status, body, headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -7,18 +7,27 @@ from ml_engine import MlEngine
 
 # TODO: modify to fit test requirements...
 class MlTestEngine(MlEngine):
+    def __init__(self):
+        super().__init__()
+        self.prediction_calls = list()
+
     def predict_with_universal_model(self, situations: List[List[int]]):
+        self.prediction_calls.append((None, len(situations)))
         probas = list()
         for i in range(len(situations)):
             probas.append(0.2)
         return np.array(probas)
 
     def predict(self, product_id: str, situations: List[List[int]]):
+        self.prediction_calls.append((product_id, len(situations)))
         probas = list()
         for i in range(len(situations)):
             probas.append(0.2)
         return np.array(probas)
 
+    def create_product_model(self):
+        pass
+
     def train_model(self, features):
         pass
 
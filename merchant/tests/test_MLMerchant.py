@@ -1,5 +1,7 @@
+from threading import Event
 from typing import List
 from unittest import TestCase
+from unittest.mock import patch
 
 from MlMerchant import MLMerchant
 from merchant_sdk.models import Product, Offer
@@ -34,6 +36,132 @@ class TestMLMerchant(TestCase):
 
         self.assertAlmostEqual(expected, actual)
 
+    def test_highest_profit_from_ml_with_breakpoints(self):
+        self.arrange()
+        self.tested.settings["price_search"] = 'breakpoints'
+        current_offers = self.create_current_offers()
+        own_offer = self.create_own_offer()
+        expected = 30.0
+
+        actual = self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+
+        self.assertAlmostEqual(expected, actual)
+        self.assertLess(sum(amount for _, amount in self.ml_testengine.prediction_calls), 42)
+
+    def test_highest_profit_from_ml_uses_prediction_cache(self):
+        self.arrange()
+        current_offers = self.create_current_offers()
+        own_offer = self.create_own_offer()
+
+        self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+        actual = self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+
+        self.assertAlmostEqual(29.95, actual)
+        self.assertEqual(1, len(self.ml_testengine.prediction_calls))
+        self.assertEqual(1, self.tested.prediction_cache.hits)
+
+    def test_prediction_cache_is_invalidated_by_new_models(self):
+        self.arrange()
+        current_offers = self.create_current_offers()
+        own_offer = self.create_own_offer()
+
+        self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+        self.tested.perform_learning()
+        self.ml_testengine.set_product_model_thread_safe('1', '')
+        self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+
+        self.assertEqual(2, len(self.ml_testengine.prediction_calls))
+        self.assertEqual(0, self.tested.prediction_cache.hits)
+
+    def test_prediction_cache_is_invalidated_by_new_sale_prices(self):
+        self.arrange()
+        current_offers = self.create_current_offers()
+        own_offer = self.create_own_offer()
+
+        self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+        self.tested.training_data.product_prices['1'].append(14.0)
+        self.tested.highest_profit_from_ml(current_offers, own_offer, 10.0)
+
+        self.assertEqual(2, len(self.ml_testengine.prediction_calls))
+        self.assertEqual(0, self.tested.prediction_cache.hits)
+
+    @patch('MlMerchant.TrainingData.append_by_kafka')
+    def test_models_are_only_retrained_after_new_training_data(self, _):
+        self.arrange()
+        self.tested.perform_learning()
+
+        with patch.object(self.tested, 'perform_learning') as perform_learning:
+            self.tested.machine_learning_worker()
+            perform_learning.assert_not_called()
+
+            self.tested.training_data.append_marketplace_situations(self.create_market_situation_line())
+            self.tested.machine_learning_worker()
+            perform_learning.assert_called_once()
+
+    def test_stopping_the_merchant_closes_the_ml_engine(self):
+        self.tested.start()
+
+        with patch.object(self.ml_testengine, 'close') as close:
+            self.tested.stop()
+
+        self.assertEqual('stopping', self.tested.get_state())
+        close.assert_called_once()
+
+    def test_only_one_machine_learning_worker_runs_at_a_time(self):
+        running = Event()
+        with patch.object(self.tested, 'machine_learning_worker', side_effect=running.wait) as machine_learning_worker:
+            self.tested.update_machine_learning()
+            self.tested.update_machine_learning()
+            running.set()
+            self.tested.learning_thread.join()
+            self.tested.update_machine_learning()
+            self.tested.learning_thread.join()
+
+        self.assertEqual(2, machine_learning_worker.call_count)
+
+    @patch('MlMerchant.random.uniform', return_value=0.5)
+    def test_calculate_optimal_prices_predicts_once_per_model(self, _):
+        self.arrange()
+        self.tested.training_data.number_marketsituations = 100
+        self.tested.training_data.product_prices = {'1': [10.0]}
+        current_offers = self.create_current_offers_of_several_products()
+        own_offers = [offer for offer in current_offers if offer.merchant_id == 'me']
+        product_prices_by_uid = {'11': 10.0, '12': 10.0, '21': 20.0}
+
+        actual = self.tested.calculate_optimal_prices(product_prices_by_uid, own_offers, MLMerchant.index_offers_by_product(current_offers))
+
+        self.assertEqual(3, len(actual))
+        self.assertAlmostEqual(29.95, actual[0])
+        self.assertAlmostEqual(29.95, actual[1])
+        self.assertAlmostEqual(59.95, actual[2])
+        self.assertListEqual([('1', 840), (None, 840)], self.ml_testengine.prediction_calls)
+
+    @patch('MlMerchant.time.monotonic', side_effect=[0.0, 0.0, 2.0])
+    @patch('MlMerchant.random.uniform', return_value=0.5)
+    def test_offers_missing_the_pricing_deadline_keep_their_price_and_go_first(self, *_):
+        self.arrange()
+        self.tested.settings["pricing_deadline"] = 1.0
+        self.tested.training_data.number_marketsituations = 100
+        self.tested.training_data.product_prices = {'1': [10.0]}
+        own_offers = [Offer(offer_id=str(i), merchant_id='me', product_id='1', uid='11', price=15.0, amount=1) for i in range(10)]
+        own_offers += [Offer(offer_id=str(i), merchant_id='me', product_id='2', uid='21', price=15.0, amount=1) for i in range(10, 12)]
+        offers_by_product = MLMerchant.index_offers_by_product(own_offers)
+
+        self.tested.update_existing_offers(offers_by_product, own_offers, {'11': 10.0, '21': 10.0})
+
+        self.assertListEqual([29.95] * 10 + [15.0] * 2, [round(offer.price, 2) for offer in own_offers])
+        self.assertSetEqual({'10', '11'}, self.tested.overdue_offer_ids)
+        self.assertEqual(2, self.tested.deadline_misses)
+        self.assertEqual(10, len(self.test_api.offers))
+
+    def test_index_offers_by_product(self):
+        current_offers = self.create_current_offers_of_several_products()
+
+        actual = MLMerchant.index_offers_by_product(current_offers)
+
+        self.assertListEqual(['1', '2', '4'], [offer.offer_id for offer in actual['1']])
+        self.assertListEqual(['3'], [offer.offer_id for offer in actual['2']])
+
     # Helper functions
     def create_product_list(self):
         product_list = list()
@@ -55,11 +183,25 @@ class TestMLMerchant(TestCase):
         offer_list.append(Offer(price=40.0))
         return offer_list
 
+    def create_current_offers_of_several_products(self) -> List[Offer]:
+        offer_list = list()
+        offer_list.append(Offer(offer_id='1', merchant_id='me', product_id='1', uid='11', price=15.0))
+        offer_list.append(Offer(offer_id='2', merchant_id='me', product_id='1', uid='12', price=25.0))
+        offer_list.append(Offer(offer_id='3', merchant_id='me', product_id='2', uid='21', price=35.0))
+        offer_list.append(Offer(offer_id='4', merchant_id='other', product_id='1', uid='11', price=20.0))
+        return offer_list
+
+    @staticmethod
+    def create_market_situation_line():
+        return {'amount': '1', 'merchant_id': 'other', 'offer_id': 'o1', 'price': '15.0', 'prime': 'True', 'product_id': '1',
+                'quality': '1', 'shipping_time_prime': '1', 'shipping_time_standard': '3', 'timestamp': '2017-05-30T08:00:00.000Z',
+                'triggering_merchant_id': 'other', 'uid': '11'}
+
     def create_own_offer(self) -> Offer:
         return Offer(product_id='1', price=30.0)
 
     def arrange(self):
         self.ml_testengine.product_model_dict['1'] = ''
         training_data = TrainingData('', '')
-        training_data.product_prices = {'1': 10.0}
+        training_data.product_prices = {'1': [10.0]}
         self.tested.training_data = training_data
@@ -21,8 +21,32 @@ class TestExtractFeatures(TestCase):
 
         self.assertListEqual(expected, actual)
 
+    def test_extract_features_for_prices_equals_single_extraction(self):
+        for universal_features in [True, False]:
+            offer_list = self.generate_competitive_offer_list()
+            potential_prices = [5.0, 10.0, 12.5, 15.0, 21.0, 30.0]
+            expected = []
+            for potential_price in potential_prices:
+                offer_list[0].price = potential_price
+                expected.append(feature_extractor.extract_features('1', offer_list, universal_features, {'1': [10.0, 14.0]}))
+
+            actual = feature_extractor.extract_features_for_prices('1', offer_list, potential_prices, universal_features, {'1': [10.0, 14.0]})
+
+            self.assertEqual((len(expected), len(expected[0])), actual.shape)
+            for expected_row, actual_row in zip(expected, actual):
+                for expected_value, actual_value in zip(expected_row, actual_row):
+                    self.assertAlmostEqual(expected_value, actual_value)
+
     # Helper functions
     def generate_offer_list(self):
         offer_list = list()
         offer_list.append(Offer(offer_id='1'))
         return offer_list
+
+    def generate_competitive_offer_list(self):
+        offer_list = list()
+        offer_list.append(Offer(offer_id='1', product_id='1', price=10.0, quality=1, shipping_time={'standard': 2}))
+        offer_list.append(Offer(offer_id='2', product_id='1', price=12.5, quality=2, shipping_time={'standard': 3}))
+        offer_list.append(Offer(offer_id='3', product_id='1', price=15.0, quality=1, shipping_time={'standard': 1}))
+        offer_list.append(Offer(offer_id='4', product_id='1', price=20.0, quality=3, shipping_time={'standard': 4}))
+        return offer_list
@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+import numpy
+from sklearn.ensemble import RandomForestRegressor
+
+from ml_engines.forest_predictor import ForestPredictor
+from ml_engines.rand_for import RandomForestEngine
+
+
+class TestForestPredictor(TestCase):
+    def setUp(self):
+        random_state = numpy.random.RandomState(0)
+        self.features = random_state.rand(300, 5)
+        self.sales = (random_state.rand(300) < self.features[:, 0]).astype(int)
+        self.situations = random_state.rand(50, 5).tolist()
+
+    # Tests
+    def test_predict_is_identical_to_sklearn(self):
+        forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(self.features, self.sales)
+        expected = forest.predict(self.situations)
+
+        actual = ForestPredictor(forest).predict(self.situations)
+
+        self.assertListEqual(list(expected), list(actual))
+
+    def test_engine_predicts_identically_with_and_without_fast_inference(self):
+        tested = RandomForestEngine()
+        tested.train_model_for_id('1', (self.features, self.sales, numpy.ones(300)))
+        tested.fast_inference = False
+        expected = tested.predict('1', self.situations)
+
+        tested.fast_inference = True
+        actual = tested.predict('1', self.situations)
+
+        self.assertListEqual(list(expected), list(actual))
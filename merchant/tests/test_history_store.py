@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy
+
+from tests import test_training_data
+from training_data import TrainingData
+from utils.history_store import HistoryStore
+
+
+class TestHistoryStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tested = HistoryStore(os.path.join(self.directory, 'history'))
+        self.training_data = TrainingData('', 'me')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Tests
+    def test_loaded_history_equals_saved_training_data(self):
+        self.arrange()
+        self.training_data.export_offsets = {'marketSituation': {'offset': 10, 'header': 'a,b', 'last_line': '1,2'}}
+
+        self.tested.save(self.training_data)
+        restored = self.tested.load()
+
+        self.assert_same_training_data(self.training_data, restored)
+        self.assertEqual(self.training_data.export_offsets, restored.export_offsets)
+        self.assertEqual(vars(self.training_data.product_prices['1']), vars(restored.product_prices['1']))
+
+    def test_saving_again_adds_a_segment_with_the_new_rows(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+        size = os.path.getsize(self.column_file('offers', 'price', 0))
+
+        self.append_offer('2017-05-30T09:00:00.000Z', 'new', 'n1', 14.0)
+        self.tested.save(self.training_data)
+        restored = self.tested.load()
+
+        self.assertEqual(size, os.path.getsize(self.column_file('offers', 'price', 0)))
+        self.assertEqual(8, os.path.getsize(self.column_file('offers', 'price', 1)))
+        self.assertListEqual([0, 1], self.segments())
+        self.assert_same_training_data(self.training_data, restored)
+
+    def test_saving_without_changes_adds_no_segment(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+
+        self.tested.save(self.training_data)
+
+        self.assertListEqual([0], self.segments())
+
+    def test_saving_after_eviction_only_records_the_evicted_rows(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+        self.append_offer('2017-05-30T09:00:00.000Z', 'new', 'n1', 14.0)
+        self.tested.save(self.training_data)
+
+        self.training_data.evict(retention_minutes=60)
+        self.tested.save(self.training_data)
+        self.append_offer('2017-05-30T09:30:00.000Z', 'new', 'n2', 13.0)
+        self.training_data.append_sales(test_training_data.TestTrainingData.create_sale('2017-05-30T09:30:01.000Z', 'm1'))
+        self.tested.save(self.training_data)
+        restored = self.tested.load()
+
+        self.assertListEqual([0, 1, 2, 3], self.segments())
+        self.assertTrue(os.path.isfile(os.path.join(self.tested.directory, 'offers.evicted.2.bin')))
+        self.assertFalse(os.path.isfile(self.column_file('offers', 'price', 2)))
+        self.assert_same_training_data(self.training_data, restored)
+        self.assertEqual(self.training_data.offer_codes.values, restored.offer_codes.values)
+
+    def test_saving_merges_the_segments_after_many_evictions(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+        self.append_offer('2017-05-30T09:00:00.000Z', 'new', 'n1', 14.0)
+
+        self.training_data.evict(max_situations_per_product=1)
+        self.tested.save(self.training_data)
+        restored = self.tested.load()
+
+        self.assertListEqual([1], self.segments())
+        self.assertFalse(os.path.isfile(self.column_file('offers', 'price', 0)))
+        self.assertEqual(8, os.path.getsize(self.column_file('offers', 'price', 1)))
+        self.assert_same_training_data(self.training_data, restored)
+
+    @patch('utils.history_store.MAX_SEGMENTS', 2)
+    def test_saving_merges_too_many_segments(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+        self.append_offer('2017-05-30T09:00:00.000Z', 'new', 'n1', 14.0)
+        self.tested.save(self.training_data)
+
+        self.append_offer('2017-05-30T09:30:00.000Z', 'new', 'n2', 13.0)
+        self.tested.save(self.training_data)
+
+        self.assertListEqual([2], self.segments())
+        self.assert_same_training_data(self.training_data, self.tested.load())
+
+    def test_load_maps_a_single_segment_and_defers_the_indexes(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+
+        restored = self.tested.load()
+
+        self.assertIsInstance(restored.offers.columns['price'].base, numpy.memmap)
+        self.assertFalse(restored.indexes_valid)
+        self.assertDictEqual({}, restored.situation_index)
+        self.assert_same_training_data(self.training_data, restored)
+        self.assertTrue(restored.indexes_valid)
+
+    def test_files_of_an_interrupted_save_are_removed(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+        for segment in [1, 2]:
+            with open(self.column_file('offers', 'price', segment), 'wb') as file:
+                file.write(b'interrupted')
+
+        self.append_offer('2017-05-30T09:00:00.000Z', 'new', 'n1', 14.0)
+        self.tested.save(self.training_data)
+
+        self.assertFalse(os.path.isfile(self.column_file('offers', 'price', 2)))
+        self.assert_same_training_data(self.training_data, self.tested.load())
+
+    def test_loaded_history_can_be_extended(self):
+        self.arrange()
+        self.tested.save(self.training_data)
+        restored = self.tested.load()
+        restored.update_indexes()
+
+        self.append_offer('2017-05-30T08:30:00.000Z', 'me', 'm1', 11.0)
+        restored.append_marketplace_situations(test_training_data.TestTrainingData.create_line('2017-05-30T08:30:00.000Z', 'me', 'm1', 11.0))
+        restored.update_timestamps()
+
+        self.assert_same_training_data(self.training_data, restored)
+        self.tested.save(restored)
+        self.assert_same_training_data(self.training_data, self.tested.load())
+
+    # Helper functions
+    def arrange(self):
+        self.append_offer('2017-05-30T06:00:00.000Z', 'me', 'm1', 10.0)
+        self.append_offer('2017-05-30T06:00:00.000Z', 'other', 'o1', 12.0)
+        self.append_offer('2017-05-30T08:00:00.000Z', 'me', 'm1', 12.0)
+        self.append_offer('2017-05-30T08:00:00.000Z', 'other', 'o1', 15.0)
+        self.training_data.append_sales(test_training_data.TestTrainingData.create_sale('2017-05-30T08:00:01.000Z', 'm1'))
+        self.training_data.append_sales(test_training_data.TestTrainingData.create_sale('2017-05-30T08:00:02.000Z', 'm1'))
+
+    def append_offer(self, timestamp, merchant_id, offer_id, price):
+        self.training_data.append_marketplace_situations(test_training_data.TestTrainingData.create_line(timestamp, merchant_id, offer_id, price))
+        self.training_data.update_timestamps()
+
+    def column_file(self, table, column, segment):
+        return os.path.join(self.tested.directory, '{}.{}.{:d}.bin'.format(table, column, segment))
+
+    def segments(self):
+        with open(os.path.join(self.tested.directory, 'manifest.json'), 'r') as file:
+            return [segment['segment'] for segment in json.load(file)['segments']]
+
+    def assert_same_training_data(self, expected: TrainingData, actual: TrainingData):
+        actual.update_indexes()
+        self.assertListEqual(expected.timestamps.tolist(), actual.timestamps.tolist())
+        for universal_features in [True, False]:
+            for expected_array, actual_array in zip(expected.create_training_data('1', universal_features),
+                                                    actual.create_training_data('1', universal_features)):
+                numpy.testing.assert_array_equal(expected_array, actual_array)
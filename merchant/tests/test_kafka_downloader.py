@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from tests.helper.export_server import ExportServer
+from utils.kafka_downloader import ExportStream
+
+HEADER = 'amount,offer_id,timestamp'
+
+
+class TestKafkaDownloader(TestCase):
+    def setUp(self):
+        self.server = ExportServer().start()
+        self.url = self.server.url + '/exports/marketSituation.csv'
+
+    def tearDown(self):
+        self.server.stop()
+
+    # Tests
+    def test_export_stream_only_downloads_new_lines(self):
+        self.server.exports['marketSituation'] = HEADER + '\n1,a,t1\n1,b,t2\n'
+        text, offset = self.download()
+
+        self.server.exports['marketSituation'] += '1,c,t3\n1,d,'
+        actual, new_offset = self.download(offset)
+
+        self.assertEqual(HEADER + '\n1,a,t1\n1,b,t2\n', text)
+        self.assertEqual(HEADER + '\n1,c,t3\n', actual)
+        self.assertEqual(('marketSituation', len(HEADER + '\n1,a,t1\n')), self.server.requested_ranges[-1])
+        self.assertEqual(len(HEADER + '\n1,a,t1\n1,b,t2\n1,c,t3\n'), new_offset['offset'])
+
+    def test_export_stream_holds_back_a_partial_last_line_until_it_is_complete(self):
+        self.server.exports['marketSituation'] = HEADER + '\n1,a,t1\n1,b,'
+        text, offset = self.download()
+
+        self.server.exports['marketSituation'] += 't2\n'
+        actual, new_offset = self.download(offset)
+
+        self.assertEqual(HEADER + '\n1,a,t1\n', text)
+        self.assertEqual('1,a,t1', offset['last_line'])
+        self.assertEqual(HEADER + '\n1,b,t2\n', actual)
+        self.assertEqual([('marketSituation', 0), ('marketSituation', len(HEADER + '\n'))], self.server.requested_ranges)
+        self.assertEqual(len(HEADER + '\n1,a,t1\n1,b,t2\n'), new_offset['offset'])
+
+    def test_export_stream_without_new_lines(self):
+        self.server.exports['marketSituation'] = HEADER + '\n1,a,t1\n'
+        text, offset = self.download()
+
+        actual, new_offset = self.download(offset)
+
+        self.assertEqual(HEADER + '\n', actual)
+        self.assertDictEqual(offset, new_offset)
+
+    def test_export_stream_downloads_changed_export_completely(self):
+        self.server.exports['marketSituation'] = HEADER + '\n1,a,t1\n1,b,t2\n'
+        text, offset = self.download()
+
+        self.server.exports['marketSituation'] = HEADER + '\n1,c,t3\n'
+        actual, new_offset = self.download(offset)
+
+        self.assertEqual(HEADER + '\n1,c,t3\n', actual)
+        self.assertEqual(('marketSituation', 0), self.server.requested_ranges[-1])
+
+    def test_export_stream_reads_large_exports_in_small_parts(self):
+        lines = ''.join('1,{:d},t{:d}\n'.format(i, i) for i in range(100000))
+        self.server.exports['marketSituation'] = HEADER + '\n' + lines
+
+        for spool in [False, True]:
+            stream = ExportStream(self.url, spool=spool).start()
+            parts = iter(lambda: stream.read(1000), b'')
+            actual = b''.join(parts).decode()
+
+            self.assertEqual(HEADER + '\n' + lines, actual)
+            self.assertEqual('1,99999,t99999', stream.offset['last_line'])
+
+    def test_export_stream_raises_if_the_download_fails(self):
+        stream = ExportStream(self.server.url + '/missing').start()
+
+        with self.assertRaises(IOError):
+            stream.read()
+
+    # Helper functions
+    def download(self, offset=None):
+        stream = ExportStream(self.url, offset).start()
+        return stream.read().decode(), stream.offset
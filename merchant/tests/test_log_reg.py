@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+import numpy
+
+from ml_engines.log_reg import LogisticRegressionEngine
+
+
+class TestLogisticRegressionEngine(TestCase):
+    def setUp(self):
+        self.tested = LogisticRegressionEngine()
+        random_state = numpy.random.RandomState(0)
+        features = {}
+        for product_id in ['1', '2', '3']:
+            product_features = random_state.rand(200, 4)
+            product_sales = (random_state.rand(200) < product_features[:, 0]).astype(int)
+            features[product_id] = (product_features, product_sales, numpy.ones(200))
+        self.tested.train_model(features)
+        self.tested.train_universal_model(features)
+        self.situations = random_state.rand(20, 4)
+
+    # Tests
+    def test_predict_equals_predict_proba(self):
+        for product_id in ['1', '2', '3']:
+            expected = self.tested.product_model_dict[product_id].predict_proba(self.situations)[:, 1]
+
+            actual = self.tested.predict(product_id, self.situations)
+
+            numpy.testing.assert_allclose(expected, actual, rtol=1e-12)
+
+    def test_predict_with_universal_model_equals_predict_proba(self):
+        expected = self.tested.universal_model.predict_proba(self.situations)[:, 1]
+
+        actual = self.tested.predict_with_universal_model(self.situations)
+
+        numpy.testing.assert_allclose(expected, actual, rtol=1e-12)
+
+    def test_predict_grouped_equals_predict(self):
+        situations_by_product = {'1': self.situations[:5], '3': self.situations[5:], None: self.situations}
+
+        actual = self.tested.predict_grouped(situations_by_product)
+
+        self.assertSetEqual({'1', '3', None}, set(actual.keys()))
+        numpy.testing.assert_allclose(self.tested.predict('1', self.situations[:5]), actual['1'], rtol=1e-12)
+        numpy.testing.assert_allclose(self.tested.predict('3', self.situations[5:]), actual['3'], rtol=1e-12)
+        numpy.testing.assert_allclose(self.tested.predict_with_universal_model(self.situations), actual[None], rtol=1e-12)
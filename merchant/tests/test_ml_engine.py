@@ -0,0 +1,82 @@
+from unittest import TestCase
+
+import numpy
+
+from ml_engine import MlEngine
+from ml_engines.log_reg import LogisticRegressionEngine
+
+
+class TestMlEngine(TestCase):
+    # Tests
+    def test_fit_weighted_passes_sample_weights(self):
+        model = WeightedModel()
+
+        MlEngine.fit_weighted(model, numpy.array([[1.], [2.]]), numpy.array([0, 1]), numpy.array([1., 3.]))
+
+        self.assertListEqual([1., 3.], list(model.sample_weight))
+
+    def test_fit_weighted_resamples_for_models_without_sample_weights(self):
+        model = UnweightedModel()
+
+        MlEngine.fit_weighted(model, numpy.array([[1.], [2.]]), numpy.array([0, 1]), numpy.array([1., 3.]))
+
+        self.assertListEqual([1., 2., 2., 2.], list(model.features[:, 0]))
+        self.assertListEqual([0, 1, 1, 1], list(model.sales))
+
+    def test_stack_training_data(self):
+        features = {'1': (numpy.ones((2, 3)), numpy.array([0, 1]), numpy.array([1., 2.])),
+                    '2': (numpy.zeros((1, 3)), numpy.array([1]), numpy.array([3.]))}
+
+        stacked_features, stacked_sales, stacked_weights = MlEngine.stack_training_data(features)
+
+        self.assertEqual((3, 3), stacked_features.shape)
+        self.assertListEqual([0, 1, 1], list(stacked_sales))
+        self.assertListEqual([1., 2., 3.], list(stacked_weights))
+
+    def test_processes_backend_trains_the_same_models_as_threads(self):
+        features = self.create_features()
+        threads = LogisticRegressionEngine(training_backend='threads', training_workers=2)
+        processes = LogisticRegressionEngine(training_backend='processes', training_workers=2)
+
+        threads.train_model(features)
+        processes.train_model(features)
+        processes.close()
+
+        for product_id in ['1', '2', '3']:
+            numpy.testing.assert_array_equal(threads.product_model_dict[product_id].coef_, processes.product_model_dict[product_id].coef_)
+            numpy.testing.assert_array_equal(threads.predict(product_id, features[product_id][0]), processes.predict(product_id, features[product_id][0]))
+
+    def test_close_shuts_down_the_training_processes(self):
+        engine = LogisticRegressionEngine(training_backend='processes', training_workers=1)
+        engine.train_model(self.create_features())
+        training_pool = engine.training_pool
+
+        engine.close()
+
+        self.assertIsNone(engine.training_pool)
+        self.assertRaises(RuntimeError, training_pool.submit, int)
+
+    # Helper functions
+    @staticmethod
+    def create_features():
+        random_state = numpy.random.RandomState(0)
+        features = {}
+        for product_id in ['1', '2', '3']:
+            product_features = random_state.rand(100, 4)
+            product_sales = (random_state.rand(100) < product_features[:, 0]).astype(int)
+            features[product_id] = (product_features, product_sales, random_state.randint(1, 4, 100).astype(float))
+        return features
+
+
+# Helper classes
+class UnweightedModel:
+    def fit(self, features, sales):
+        self.features = features
+        self.sales = sales
+        return self
+
+
+class WeightedModel:
+    def fit(self, features, sales, sample_weight=None):
+        self.sample_weight = sample_weight
+        return self
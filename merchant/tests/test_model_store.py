@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+
+from ml_engines.log_reg import LogisticRegressionEngine
+from ml_engines.rand_for import RandomForestEngine
+from utils.model_store import ModelStore
+
+
+class TestModelStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tested = ModelStore(os.path.join(self.directory, 'models'))
+        random_state = numpy.random.RandomState(0)
+        self.features = {}
+        for product_id in ['1', '2']:
+            product_features = random_state.rand(100, 4)
+            product_sales = (random_state.rand(100) < product_features[:, 0]).astype(int)
+            self.features[product_id] = (product_features, product_sales, numpy.ones(100))
+        self.situations = random_state.rand(20, 4)
+        self.watermark = {'generation': 0, 'situations': 10, 'offers': 40, 'sales': 5}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Tests
+    def test_restored_models_predict_like_the_saved_models(self):
+        for engine_class in [LogisticRegressionEngine, RandomForestEngine]:
+            saved = self.train(engine_class())
+            self.tested.save(saved, self.watermark)
+
+            restored = engine_class()
+            watermark = self.tested.load(restored)
+
+            self.assertEqual(self.watermark, watermark)
+            self.assertGreater(restored.model_version, 0)
+            for product_id in ['1', '2']:
+                numpy.testing.assert_array_equal(saved.predict(product_id, self.situations), restored.predict(product_id, self.situations))
+            numpy.testing.assert_array_equal(saved.predict_with_universal_model(self.situations),
+                                             restored.predict_with_universal_model(self.situations))
+
+    def test_only_the_latest_version_is_kept(self):
+        engine = self.train(LogisticRegressionEngine())
+
+        self.tested.save(engine, self.watermark)
+        self.tested.save(engine, dict(self.watermark, sales=6))
+
+        self.assertListEqual(['version_1'], [name for name in os.listdir(self.tested.directory) if name.startswith('version_')])
+        self.assertEqual(6, self.tested.load(LogisticRegressionEngine())['sales'])
+
+    def test_models_of_another_engine_are_not_restored(self):
+        self.tested.save(self.train(LogisticRegressionEngine()), self.watermark)
+        restored = RandomForestEngine()
+
+        self.assertIsNone(self.tested.load(restored))
+        self.assertDictEqual({}, restored.product_model_dict)
+
+    def test_load_without_saved_models(self):
+        self.assertIsNone(self.tested.load(LogisticRegressionEngine()))
+
+    # Helper functions
+    def train(self, engine):
+        engine.train_model(self.features)
+        engine.train_universal_model(self.features)
+        return engine
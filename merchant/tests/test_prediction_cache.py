@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from merchant_sdk.models import Offer
+from utils.prediction_cache import PredictionCache
+
+
+class TestPredictionCache(TestCase):
+    def setUp(self):
+        self.tested = PredictionCache(max_size=2)
+
+    # Tests
+    def test_get_counts_hits_and_misses(self):
+        self.tested.put('a', 10.0, [10.0], [1.0])
+
+        self.assertEqual(10.0, self.tested.get('a').best_price)
+        self.assertIsNone(self.tested.get('b'))
+        self.assertEqual(1, self.tested.hits)
+        self.assertEqual(1, self.tested.misses)
+        self.assertAlmostEqual(0.5, self.tested.hit_rate)
+
+    def test_peek_does_not_count_lookups(self):
+        self.tested.put('a', 10.0, [10.0], [1.0])
+
+        self.assertEqual(10.0, self.tested.peek('a').best_price)
+        self.assertIsNone(self.tested.peek('b'))
+        self.assertEqual((0, 0), (self.tested.hits, self.tested.misses))
+
+    def test_put_evicts_least_recently_used_entry(self):
+        self.tested.put('a', 10.0, [], [])
+        self.tested.put('b', 20.0, [], [])
+        self.tested.get('a')
+
+        self.tested.put('c', 30.0, [], [])
+
+        self.assertEqual(2, len(self.tested))
+        self.assertIsNotNone(self.tested.get('a'))
+        self.assertIsNone(self.tested.get('b'))
+
+    def test_fingerprint_ignores_own_price_and_order_of_competitors(self):
+        own_offer = Offer(offer_id='1', product_id='1', price=12.0)
+        competitors = [Offer(offer_id='2', product_id='1', price=15.0), Offer(offer_id='3', product_id='1', price=11.0)]
+
+        expected = PredictionCache.fingerprint(own_offer, [own_offer] + competitors, 10.0, 12.0, 1)
+        own_offer.price = 17.0
+        actual = PredictionCache.fingerprint(own_offer, list(reversed(competitors)) + [own_offer], 10.0, 12.0, 1)
+
+        self.assertEqual(expected, actual)
+        self.assertNotEqual(expected, PredictionCache.fingerprint(own_offer, competitors, 10.0, 12.0, 2))
+        self.assertNotEqual(expected, PredictionCache.fingerprint(own_offer, competitors, 10.0, 13.0, 1))
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+from utils.price_optimizer import GridPriceOptimizer, BreakpointPriceOptimizer, CoarseToFinePriceOptimizer, create_price_optimizer
+from utils.settingsbuilder import SettingsBuilder
+
+
+class TestPriceOptimizer(TestCase):
+    # Tests
+    def test_grid_optimizer_searches_one_round(self):
+        tested = GridPriceOptimizer()
+
+        evaluated_prices = self.optimize(tested, 10.0, [])
+
+        self.assertEqual(420, len(evaluated_prices))
+
+    def test_breakpoint_optimizer_refines_once(self):
+        tested = BreakpointPriceOptimizer()
+
+        evaluated_prices = self.optimize(tested, 10.0, [12.0, 24.5])
+
+        self.assertIn(12.0, evaluated_prices)
+        self.assertIn(24.49, evaluated_prices)
+        self.assertLess(len(evaluated_prices), 30)
+
+    def test_coarse_to_fine_optimizer_respects_max_evaluations(self):
+        for max_evaluations in [10, 30, 60]:
+            tested = CoarseToFinePriceOptimizer(max_evaluations)
+
+            evaluated_prices = self.optimize(tested, 10.0, [])
+
+            self.assertLessEqual(len(evaluated_prices), max_evaluations)
+            self.assertEqual(len(evaluated_prices), len(set(evaluated_prices)))
+
+    def test_coarse_to_fine_optimizer_finds_best_price(self):
+        tested = CoarseToFinePriceOptimizer(60)
+
+        evaluated_prices = self.optimize(tested, 10.0, [])
+
+        self.assertAlmostEqual(17.23, max(evaluated_prices, key=self.expected_profit), delta=0.05)
+
+    def test_create_price_optimizer(self):
+        settings = SettingsBuilder().build()
+        self.assertIsInstance(create_price_optimizer(settings), GridPriceOptimizer)
+        settings["price_search"] = 'breakpoints'
+        self.assertIsInstance(create_price_optimizer(settings), BreakpointPriceOptimizer)
+        settings["price_search"] = 'coarse_to_fine'
+        self.assertIsInstance(create_price_optimizer(settings), CoarseToFinePriceOptimizer)
+
+    # Helper functions
+    def optimize(self, price_optimizer, price, competitor_prices):
+        evaluated_prices = []
+        expected_profits = []
+        next_prices = price_optimizer.initial_prices(price, competitor_prices)
+        search_round = 0
+        while next_prices:
+            evaluated_prices += next_prices
+            expected_profits += [self.expected_profit(next_price) for next_price in next_prices]
+            search_round += 1
+            next_prices = price_optimizer.next_prices(price, evaluated_prices, expected_profits, search_round)
+        return evaluated_prices
+
+    @staticmethod
+    def expected_profit(price):
+        return -(price - 17.23) ** 2
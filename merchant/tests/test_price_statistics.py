@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from utils.price_statistics import PriceStatistics
+
+
+class TestPriceStatistics(TestCase):
+    # Tests
+    def test_average_of_all_prices(self):
+        statistics = PriceStatistics.from_prices([10.0, 12.0, 20.0])
+
+        self.assertEqual(3, statistics.count)
+        self.assertAlmostEqual(14.0, statistics.average)
+
+    def test_average_without_prices_is_zero(self):
+        self.assertEqual(0, PriceStatistics().average)
+
+    def test_decayed_average_halves_the_weight_of_older_prices(self):
+        statistics = PriceStatistics(half_life=60.0)
+
+        statistics.add(10.0, 0)
+        statistics.add(40.0, 60 * 60000)
+
+        # 10.0 weighs 0.5, 40.0 weighs 1
+        self.assertAlmostEqual(30.0, statistics.average)
+        self.assertAlmostEqual(25.0, statistics.total / statistics.count)
+
+    def test_remove_evicted_prices(self):
+        statistics = PriceStatistics(half_life=60.0)
+        statistics.add(10.0, 0)
+        statistics.add(40.0, 60 * 60000)
+        statistics.add(20.0, 120 * 60000)
+
+        statistics.remove([10.0], [0])
+
+        self.assertEqual(2, statistics.count)
+        self.assertAlmostEqual(60.0, statistics.total)
+        self.assertAlmostEqual((0.5 * 40.0 + 20.0) / 1.5, statistics.average)
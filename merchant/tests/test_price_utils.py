@@ -35,6 +35,27 @@ class TestPriceUtils(TestCase):
 
         self.assertListEqual(expected, actual)
 
+    def test_get_breakpoint_prices(self):
+        expected = [9.0, 11.99, 12.0, 24.49, 24.5, 30.0]
+
+        actual = self.tested.get_breakpoint_prices(10, [5.0, 12.0, '24.5', 35.0])
+
+        self.assertListEqual(expected, actual)
+
+    def test_get_refined_prices_are_between_neighbours_of_best_price(self):
+        expected = [11.05, 11.1, 11.15, 11.2, 11.25]
+
+        actual = self.tested.get_refined_prices([9.0, 11.0, 11.29, 11.3, 30.0], [0.1, 0.3, 0.5, 0.2, 0.0])
+
+        self.assertListEqual(expected, actual)
+
+    def test_get_refined_prices_are_limited(self):
+        actual = self.tested.get_refined_prices([9.0, 30.0], [0.1, 0.5], max_amount=10)
+
+        self.assertEqual(10, len(actual))
+        self.assertGreater(min(actual), 9.0)
+        self.assertLess(max(actual), 30.0)
+
     # Helper functions
     def assert_potential_prices_without_random_distances(self, actual, expected):
         self.assertEqual(420, len(actual))
@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+import numpy
+from sklearn.linear_model import LogisticRegression
+
+from utils.row_aggregation import aggregate_identical_rows
+
+
+class TestRowAggregation(TestCase):
+    # Tests
+    def test_aggregate_identical_rows(self):
+        features = numpy.array([[1., 2.], [1., 2.], [3., 4.], [1., 2.]])
+        sales = numpy.array([0, 0, 1, 1])
+        weights = numpy.array([1., 2., 3., 4.])
+
+        actual_features, actual_sales, actual_weights = aggregate_identical_rows(features, sales, weights)
+
+        self.assertListEqual([[1., 2.], [1., 2.], [3., 4.]], actual_features.tolist())
+        self.assertListEqual([0, 1, 1], actual_sales.tolist())
+        self.assertListEqual([3., 4., 3.], actual_weights.tolist())
+
+    def test_aggregated_rows_fit_the_same_model(self):
+        random_state = numpy.random.RandomState(0)
+        features = random_state.randint(0, 4, (500, 3)).astype(float)
+        sales = (random_state.rand(500) < features[:, 0] / 4).astype(int)
+        weights = random_state.randint(1, 4, 500).astype(float)
+
+        aggregated = aggregate_identical_rows(features, sales, weights)
+        expected = LogisticRegression(tol=1e-10).fit(features, sales, sample_weight=weights)
+        actual = LogisticRegression(tol=1e-10).fit(aggregated[0], aggregated[1], sample_weight=aggregated[2])
+
+        self.assertLess(len(aggregated[1]), 130)
+        numpy.testing.assert_allclose(expected.coef_, actual.coef_, rtol=1e-4)
@@ -52,6 +52,19 @@ class TestSettings(TestCase):
             "underprice": 0.2,
             "initialProducts": 5,
             "min_marketsituations": 50,
+            "price_search": 'fixed',
+            "max_price_evaluations": 60,
+            "prediction_cache_size": 1000,
+            "pricing_deadline": 0.0,
+            "recency_weighting": 'steps',
+            "recency_half_life": 60.0,
+            "aggregate_training_rows": True,
+            "retention_minutes": 0.0,
+            "max_situations_per_product": 0,
+            "average_price_half_life": 0.0,
+            "incremental_kafka_refresh": True,
+            "training_backend": 'threads',
+            "training_workers": 8,
             "market_situation_csv_path": '../data/marketSituation.csv',
             "buy_offer_csv_path": '../data/buyOffer.csv',
             "initial_merchant_id": 'DaywOe3qbtT3C8wBBSV+zBOH55DVz40L6PH1/1p9xCM=',
@@ -76,6 +89,19 @@ class TestSettings(TestCase):
             "underprice": 0.2,
             "initialProducts": 5,
             "min_marketsituations": 50,
+            "price_search": 'fixed',
+            "max_price_evaluations": 60,
+            "prediction_cache_size": 1000,
+            "pricing_deadline": 0.0,
+            "recency_weighting": 'steps',
+            "recency_half_life": 60.0,
+            "aggregate_training_rows": True,
+            "retention_minutes": 0.0,
+            "max_situations_per_product": 0,
+            "average_price_half_life": 0.0,
+            "incremental_kafka_refresh": True,
+            "training_backend": 'threads',
+            "training_workers": 8,
             "market_situation_csv_path": '../data/marketSituation.csv',
             "buy_offer_csv_path": '../data/buyOffer.csv',
             "initial_merchant_id": 'DaywOe3qbtT3C8wBBSV+zBOH55DVz40L6PH1/1p9xCM=',
@@ -100,6 +126,19 @@ class TestSettings(TestCase):
             "underprice": 0.2,
             "initialProducts": 5,
             "min_marketsituations": 50,
+            "price_search": 'fixed',
+            "max_price_evaluations": 60,
+            "prediction_cache_size": 1000,
+            "pricing_deadline": 0.0,
+            "recency_weighting": 'steps',
+            "recency_half_life": 60.0,
+            "aggregate_training_rows": True,
+            "retention_minutes": 0.0,
+            "max_situations_per_product": 0,
+            "average_price_half_life": 0.0,
+            "incremental_kafka_refresh": True,
+            "training_backend": 'threads',
+            "training_workers": 8,
             "market_situation_csv_path": 'testValue1',
             "buy_offer_csv_path": 'testValue2',
             "initial_merchant_id": 'testValue3',
@@ -133,6 +172,19 @@ class TestSettings(TestCase):
             "underprice": 0.2,
             "initialProducts": 5,
             "min_marketsituations": 50,
+            "price_search": 'fixed',
+            "max_price_evaluations": 60,
+            "prediction_cache_size": 1000,
+            "pricing_deadline": 0.0,
+            "recency_weighting": 'steps',
+            "recency_half_life": 60.0,
+            "aggregate_training_rows": True,
+            "retention_minutes": 0.0,
+            "max_situations_per_product": 0,
+            "average_price_half_life": 0.0,
+            "incremental_kafka_refresh": True,
+            "training_backend": 'threads',
+            "training_workers": 8,
             "market_situation_csv_path": '../data/marketSituation.csv',
             "buy_offer_csv_path": '../data/buyOffer.csv',
             "initial_merchant_id": 'DaywOe3qbtT3C8wBBSV+zBOH55DVz40L6PH1/1p9xCM=',
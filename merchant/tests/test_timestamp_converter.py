@@ -0,0 +1,27 @@
+from datetime import timedelta
+from unittest import TestCase
+
+from utils.timestamp_converter import TimestampConverter, EPOCH
+
+
+class TestTimestampConverter(TestCase):
+    # Tests
+    def test_to_epoch_ms_equals_strptime(self):
+        for timestamp in ['2017-05-30T06:00:13.776Z', '1970-01-01T00:00:00.000Z', '2016-02-29T23:59:59.999Z', '2017-12-31T12:30:01.5Z',
+                          '2017-01-01T00:00:00.123456Z']:
+            expected = (TimestampConverter.from_string(timestamp) - EPOCH) // timedelta(milliseconds=1)
+
+            actual = TimestampConverter.to_epoch_ms(timestamp)
+
+            self.assertEqual(expected, actual)
+
+    def test_to_string_is_inverse_of_to_epoch_ms(self):
+        timestamp = '2017-05-30T06:00:13.076Z'
+
+        actual = TimestampConverter.to_string(TimestampConverter.to_epoch_ms(timestamp))
+
+        self.assertEqual(timestamp, actual)
+
+    def test_to_epoch_ms_rejects_other_formats(self):
+        with self.assertRaises(ValueError):
+            TimestampConverter.to_epoch_ms('30.05.2017 06:00:13')
@@ -0,0 +1,304 @@
+import io
+import pickle
+from functools import partial
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy
+
+from merchant_sdk.models import Offer
+from models.joined_market_situation import JoinedMarketSituation
+from tests.helper.export_server import ExportServer
+from training_data import TrainingData
+from utils.feature_extractor import extract_features, extract_features_of_market_situations
+from utils.recency_weighting import exponential_weights
+from utils.utils import get_buy_offer_fieldnames, get_market_situation_fieldnames, read_csv_chunks
+
+
+class TestTrainingData(TestCase):
+    def setUp(self):
+        self.tested = TrainingData('', 'me')
+
+    # Tests
+    def test_create_training_data_equals_extract_features(self):
+        self.arrange()
+
+        for universal_features in [True, False]:
+            features, sales, weights = self.tested.create_training_data('1', universal_features)
+
+            expected = []
+            for product_id, timestamp, jms in self.tested.iterate_joined_market_situations():
+                if product_id == '1':
+                    for offer_id in jms.merchants['me']:
+                        expected.append(extract_features(offer_id, TrainingData.create_offer_list(jms), universal_features, self.tested.product_prices))
+            numpy.testing.assert_allclose(numpy.unique(expected, axis=0), numpy.unique(features, axis=0))
+
+    def test_sales_are_joined_to_market_situations(self):
+        self.arrange()
+
+        features, sales, weights = self.tested.create_training_data('1', False)
+
+        # the first situation is older than an hour, the second is recent and sold twice
+        self.assertListEqual([0, 1], list(sales))
+        self.assertListEqual([1, 6], list(weights))
+        self.assertEqual(1, self.tested.sales_wo_ms)
+        self.assertEqual((2, 24.0), (self.tested.product_prices['1'].count, self.tested.product_prices['1'].total))
+
+    def test_sales_are_joined_to_the_closest_situation_of_the_offer(self):
+        self.append_offer('2017-05-30T06:00:00.000Z', 'me', 'm1', 10.0)
+        for minute in range(1, 13):
+            self.append_offer('2017-05-30T06:{:02d}:00.000Z'.format(minute), 'other', 'o1', 12.0, product_id='2')
+        self.tested.update_timestamps()
+
+        self.tested.append_sales(self.create_sale('2017-05-30T06:05:30.000Z', 'm1'))
+        self.tested.append_sales(self.create_sale('2017-05-30T06:12:30.000Z', 'm1'))
+
+        # the second sale is more than ten timestamps after the situation of the offer
+        features, sales, weights = self.tested.create_training_data('1', False)
+        self.assertListEqual([1], list(sales))
+        self.assertEqual(1, self.tested.sales_wo_ms)
+        self.assertEqual(0, self.tested.find_index_of_corresponding_market_situation(5, '1', 'm1'))
+        self.assertEqual(-1, self.tested.find_index_of_corresponding_market_situation(5, '1', 'unknown'))
+
+    def test_update_timestamps_merges_new_situations(self):
+        self.arrange()
+        self.append_offer('2017-05-30T09:00:00.000Z', 'me', 'm1', 11.0, product_id='2')
+        self.append_offer('2017-05-30T08:30:00.000Z', 'me', 'm1', 11.0)
+        self.append_offer('2017-05-30T09:00:00.000Z', 'me', 'm1', 11.0)
+
+        self.tested.update_timestamps()
+        self.tested.update_timestamps()
+
+        self.assertListEqual(numpy.unique(self.tested.situations['timestamp']).tolist(), self.tested.timestamps.tolist())
+        self.assertEqual(4, len(self.tested.timestamps))
+
+    def test_evict_drops_old_situations_and_their_sales(self):
+        self.append_offer('2017-05-30T06:00:00.000Z', 'me', 'm0', 9.0)
+        self.tested.update_timestamps()
+        self.tested.append_sales(self.create_sale('2017-05-30T06:00:01.000Z', 'm0'))
+        self.arrange()
+
+        evicted = self.tested.evict(retention_minutes=60)
+
+        self.assertEqual(1, evicted)
+        self.assertListEqual(['2017-05-30T08:00:00.000Z'], [timestamp for _, timestamp, _ in self.tested.iterate_joined_market_situations()])
+        self.assertListEqual([1], list(self.tested.create_training_data('1', False)[1]))
+        self.assertEqual((2, 24.0), (self.tested.product_prices['1'].count, self.tested.product_prices['1'].total))
+        self.assertEqual(-1, self.tested.offer_codes.get('m0'))
+
+    def test_evict_keeps_latest_situations_of_each_product(self):
+        self.arrange()
+        self.append_offer('2017-05-30T07:00:00.000Z', 'me', 'm2', 10.0, product_id='2')
+        self.tested.update_timestamps()
+
+        self.assertEqual(1, self.tested.evict(max_situations_per_product=1))
+        self.assertEqual(0, self.tested.evict(max_situations_per_product=1))
+
+        self.append_offer('2017-05-30T08:30:00.000Z', 'me', 'm1', 11.0)
+        self.tested.update_timestamps()
+        self.tested.append_sales(self.create_sale('2017-05-30T08:30:01.000Z', 'm1'))
+        self.assertListEqual([1, 1], list(self.tested.create_training_data('1', False)[1]))
+        self.assertListEqual([4, 3], list(self.tested.create_training_data('1', False)[2]))
+
+    def test_training_data_without_situations(self):
+        self.assertEqual(0, self.tested.evict(retention_minutes=60, max_situations_per_product=1))
+
+        features, sales, weights = self.tested.create_training_data('1', False)
+        self.tested.print_info()
+
+        self.assertEqual((0, 0, 0), (len(features), len(sales), len(weights)))
+        self.assertDictEqual({}, self.tested.convert_training_data())
+
+    def test_offers_listed_twice_are_stored_once(self):
+        self.arrange()
+        self.append_offer('2017-05-30T08:00:00.000Z', 'other', 'o1', 99.0)
+
+        jms = [jms for _, timestamp, jms in self.tested.iterate_joined_market_situations() if timestamp == '2017-05-30T08:00:00.000Z'][0]
+
+        self.assertEqual(3, len(TrainingData.create_offer_list(jms)))
+        self.assertEqual(15.0, jms.merchants['other']['o1'].price)
+
+    def test_convert_training_data_skips_products_without_sales(self):
+        self.arrange()
+        self.append_offer('2017-05-30T08:00:00.000Z', 'me', 'm2', 10.0, product_id='2')
+
+        converted = self.tested.convert_training_data()
+
+        self.assertListEqual(['1'], list(converted.keys()))
+
+    def test_universal_features_are_views_of_product_specific_features(self):
+        self.arrange()
+
+        converted = self.tested.convert_training_data()
+        universal = TrainingData.select_universal_features(converted)
+
+        self.assertEqual((2, 5), universal['1'][0].shape)
+        self.assertTrue(numpy.shares_memory(converted['1'][0], universal['1'][0]))
+        numpy.testing.assert_allclose(self.tested.create_training_data('1', True)[0], universal['1'][0])
+
+    def test_create_training_data_only_extracts_features_of_new_situations(self):
+        self.arrange()
+        self.tested.create_training_data('1', False)
+        self.append_offer('2017-05-30T08:30:00.000Z', 'me', 'm1', 11.0)
+        self.append_offer('2017-05-30T08:30:00.000Z', 'other', 'o1', 14.0)
+        self.tested.update_timestamps()
+
+        with patch('training_data.extract_features_of_market_situations', wraps=extract_features_of_market_situations) as extract:
+            features, sales, weights = self.tested.create_training_data('1', False)
+
+        self.assertEqual(1, len(extract.call_args[0][4]))
+        self.tested.feature_cache.clear()
+        numpy.testing.assert_allclose(self.tested.create_training_data('1', False)[0], features)
+
+    def test_changed_situations_are_extracted_again(self):
+        self.arrange()
+        self.tested.create_training_data('1', True)
+
+        # bypass the filter of outdated market situations
+        timestamps, self.tested.timestamps = self.tested.timestamps, self.tested.timestamps[:0]
+        self.append_offer('2017-05-30T08:00:00.000Z', 'fourth', 'f1', 1.0)
+        self.tested.timestamps = timestamps
+        features, sales, weights = self.tested.create_training_data('1', True)
+
+        self.assertListEqual([2, 4], list(features[-1][:2]))
+
+    def test_create_training_data_with_exponential_recency_weighting(self):
+        self.arrange()
+
+        features, sales, weights = self.tested.create_training_data('1', False, recency_weighting=partial(exponential_weights, half_life=60.0))
+
+        self.assertListEqual([0.25, 2.0], list(weights))
+
+    def test_convert_training_data_aggregates_identical_rows(self):
+        self.arrange()
+        self.append_offer('2017-05-30T08:10:00.000Z', 'me', 'm1', 12.0)
+        self.append_offer('2017-05-30T08:10:00.000Z', 'other', 'o1', 15.0)
+        self.append_offer('2017-05-30T08:10:00.000Z', 'third', 't1', 13.0)
+        self.tested.update_timestamps()
+
+        features, sales, weights = self.tested.convert_training_data(aggregate_rows=True)['1']
+
+        self.assertListEqual([0, 0, 1], list(sales))
+        self.assertListEqual([1, 3, 4], list(weights))
+
+    def test_append_by_csvs_equals_appending_lines(self):
+        self.arrange()
+        lines = [self.create_line('2017-05-30T06:00:00.000Z', 'csv', 'm1', 10.0), self.create_line('2017-05-30T06:00:00.000Z', 'other', 'o1', 12.0),
+                 self.create_line('2017-05-30T08:00:00.000Z', 'csv', 'm1', 12.0), self.create_line('2017-05-30T08:00:00.000Z', 'other', 'o1', 15.0),
+                 self.create_line('2017-05-30T08:00:00.000Z', 'third', 't1', 13.0)]
+        sales = [self.create_sale('2017-05-30T08:00:01.000Z', 'm1'), self.create_sale('2017-05-30T08:00:02.000Z', 'm1'),
+                 self.create_sale('2017-05-30T08:00:03.000Z', 'unknown')]
+
+        # the market situations are written without header
+        tested = TrainingData('', 'me')
+        tested.append_by_csvs(self.create_csv(lines, get_market_situation_fieldnames(), False),
+                              self.create_csv(sales, get_buy_offer_fieldnames(), True), 'csv')
+
+        for expected, actual in zip(self.tested.create_training_data('1', False), tested.create_training_data('1', False)):
+            numpy.testing.assert_allclose(expected, actual)
+        self.assertEqual(1, tested.sales_wo_ms)
+
+    def test_append_by_kafka_only_ingests_new_lines(self):
+        server = ExportServer().start()
+        self.addCleanup(server.stop)
+        lines = [self.create_line('2017-05-30T06:00:00.000Z', 'me', 'm1', 10.0), self.create_line('2017-05-30T06:00:00.000Z', 'other', 'o1', 12.0)]
+        server.exports['marketSituation'] = self.create_csv(lines, get_market_situation_fieldnames(), True).getvalue()
+        server.exports['buyOffer'] = self.create_csv([], get_buy_offer_fieldnames(), True).getvalue()
+        self.tested.append_by_kafka(server.url)
+
+        server.exports['marketSituation'] += self.create_csv([self.create_line('2017-05-30T08:00:00.000Z', 'me', 'm1', 12.0)],
+                                                             get_market_situation_fieldnames(), False).getvalue()
+        server.exports['buyOffer'] += self.create_csv([self.create_sale('2017-05-30T08:00:01.000Z', 'm1')], get_buy_offer_fieldnames(), False).getvalue()
+        restored = pickle.loads(pickle.dumps(self.tested))
+        restored.append_by_kafka(server.url)
+
+        self.assertEqual(2, len(restored.timestamps))
+        self.assertEqual(3, len(restored.offers))
+        self.assertListEqual([0, 1], list(restored.create_training_data('1', False)[1]))
+        self.assertGreater(dict(server.requested_ranges[2:])['marketSituation'], 0)
+
+    def test_append_by_kafka_undoes_a_partially_ingested_export(self):
+        server = ExportServer().start()
+        self.addCleanup(server.stop)
+        lines = [self.create_line('2017-05-30T06:00:00.000Z', 'me', 'm1', 10.0), self.create_line('2017-05-30T06:00:00.000Z', 'other', 'o1', 12.0)]
+        server.exports['marketSituation'] = self.create_csv(lines, get_market_situation_fieldnames(), True).getvalue()
+        sales = [self.create_sale('2017-05-30T06:00:01.000Z', 'm1'), self.create_sale('2017-05-30T06:00:02.000Z', 'm1')]
+        server.exports['buyOffer'] = self.create_csv(sales, get_buy_offer_fieldnames(), True).getvalue().replace('06:00:02.000Z', '06:00:')
+
+        # the second sale fails after the situations and the first sale were appended
+        with patch('training_data.read_csv_chunks', partial(read_csv_chunks, chunk_size=1)):
+            self.tested.append_by_kafka(server.url)
+
+            self.assertEqual(0, len(self.tested.offers))
+            self.assertEqual(0, self.tested.total_sale_events)
+            self.assertDictEqual({}, self.tested.product_prices)
+            self.assertDictEqual({}, self.tested.export_offsets)
+
+            server.exports['buyOffer'] = self.create_csv(sales, get_buy_offer_fieldnames(), True).getvalue()
+            self.tested.append_by_kafka(server.url)
+
+        self.assertEqual(2, len(self.tested.offers))
+        self.assertEqual(2, len(self.tested.sales))
+        self.assertListEqual([1], list(self.tested.create_training_data('1', False)[1]))
+        self.assertEqual(2, self.tested.product_prices['1'].count)
+
+    def test_pickled_training_data_can_be_extended(self):
+        self.arrange()
+
+        restored = pickle.loads(pickle.dumps(self.tested))
+        restored.append_marketplace_situations(self.create_line('2017-05-30T08:30:00.000Z', 'me', 'm1', 11.0))
+        restored.update_timestamps()
+
+        self.assertEqual(3, len(restored.timestamps))
+        self.assertListEqual([1, 4, 3], list(restored.create_training_data('1', False)[2]))
+
+    def test_migrates_pickles_of_object_based_store(self):
+        jms = JoinedMarketSituation()
+        jms.merchants['me'] = {'m1': Offer(offer_id='m1', price='12.0', quality='1', product_id='1', shipping_time={'standard': '3'})}
+        jms.merchants['other'] = {'o1': Offer(offer_id='o1', price='15.0', quality='2', product_id='1', shipping_time={'standard': '1'})}
+        jms.sales.append(('2017-05-30T08:00:00.500Z', 'm1'))
+        legacy = TrainingData.__new__(TrainingData)
+        legacy.__dict__ = {'joined_data': {'1': {'2017-05-30T08:00:00.000Z': jms}}, 'merchant_token': '', 'merchant_id': 'me',
+                           'timestamps': ['2017-05-30T08:00:00.000Z'], 'last_sale_timestamp': '2017-05-30T08:00:00.500Z',
+                           'total_sale_events': 1, 'sales_wo_ms': 0, 'number_marketsituations': 1, 'product_prices': {'1': [12.0]}}
+
+        migrated = TrainingData.__new__(TrainingData)
+        migrated.__setstate__(legacy.__getstate__())
+        features, sales, weights = migrated.create_training_data('1', False)
+
+        self.assertListEqual([1], list(sales))
+        self.assertListEqual([3], list(weights))
+        self.assertListEqual(extract_features('m1', TrainingData.create_offer_list(jms), False, {'1': [12.0]}), list(features[0]))
+        self.assertEqual(12.0, migrated.product_prices['1'].average)
+
+    # Helper functions
+    def arrange(self):
+        self.append_offer('2017-05-30T06:00:00.000Z', 'me', 'm1', 10.0)
+        self.append_offer('2017-05-30T06:00:00.000Z', 'other', 'o1', 12.0)
+        self.append_offer('2017-05-30T08:00:00.000Z', 'me', 'm1', 12.0)
+        self.append_offer('2017-05-30T08:00:00.000Z', 'other', 'o1', 15.0)
+        self.append_offer('2017-05-30T08:00:00.000Z', 'third', 't1', 13.0)
+        self.tested.update_timestamps()
+        self.tested.append_sales(self.create_sale('2017-05-30T08:00:01.000Z', 'm1'))
+        self.tested.append_sales(self.create_sale('2017-05-30T08:00:02.000Z', 'm1'))
+        self.tested.append_sales(self.create_sale('2017-05-30T08:00:03.000Z', 'unknown'))
+
+    def append_offer(self, timestamp, merchant_id, offer_id, price, product_id='1'):
+        self.tested.append_marketplace_situations(self.create_line(timestamp, merchant_id, offer_id, price, product_id))
+
+    @staticmethod
+    def create_line(timestamp, merchant_id, offer_id, price, product_id='1'):
+        return {'amount': '1', 'merchant_id': merchant_id, 'offer_id': offer_id, 'price': str(price), 'prime': 'True',
+                'product_id': product_id, 'quality': '1', 'shipping_time_prime': '1', 'shipping_time_standard': '3',
+                'timestamp': timestamp, 'triggering_merchant_id': merchant_id, 'uid': product_id + '1'}
+
+    @staticmethod
+    def create_csv(lines, fieldnames, header):
+        rows = [fieldnames] if header else []
+        rows += [[line[fieldname] for fieldname in fieldnames] for line in lines]
+        return io.StringIO('\n'.join(','.join(row) for row in rows) + '\n')
+
+    @staticmethod
+    def create_sale(timestamp, offer_id):
+        return {'amount': '1', 'consumer_id': 'c', 'http_code': '200', 'left_in_stock': '1', 'merchant_id': 'me', 'offer_id': offer_id,
+                'price': '12.0', 'product_id': '1', 'quality': '1', 'timestamp': timestamp, 'uid': '11'}
@@ -1,90 +1,223 @@
 import bisect
-import csv
+import copy
 import logging
+from collections import namedtuple
 from typing import List
 
+import numpy
+import pandas
+
 from utils.timestamp_converter import TimestampConverter
 
 from merchant_sdk.models import Offer
 from models.joined_market_situation import JoinedMarketSituation
-from utils.utils import get_buy_offer_fieldnames, get_market_situation_fieldnames
-from utils.feature_extractor import extract_features
+from utils.column_table import ColumnTable, Codebook
+from utils.utils import get_buy_offer_fieldnames, get_market_situation_fieldnames, read_csv_chunks, ID_DTYPES
+from utils.feature_extractor import extract_features_of_market_situations, NUM_OF_UNIVERSAL_FEATURES
 from utils.kafka_downloader import download_kafka_files
+from utils.price_statistics import PriceStatistics
+from utils.recency_weighting import step_weights
+from utils.row_aggregation import aggregate_identical_rows
+
+MILLISECONDS_PER_MINUTE = 60000
+MAX_SALE_DISTANCE = 10  # timestamps between a sale and the market situation it is joined to
+AVERAGE_SALE_PRICE_COLUMN = 10
+
+OfferGroups = namedtuple('OfferGroups', ['rows', 'offsets', 'grouped_offers'])
+CachedFeatures = namedtuple('CachedFeatures', ['covered_situations', 'own_rows', 'features'])
+SALE_COLUMNS = {'situation': numpy.int32, 'offer': numpy.int32, 'timestamp': numpy.int64, 'price': numpy.float64}
+APPENDED = ['situations', 'offers', 'sales', 'product_codes', 'merchant_codes', 'offer_codes']  # tables and codebooks rows are appended to
+SALE_SCALARS = ['last_sale_timestamp', 'total_sale_events', 'sales_wo_ms']
 
 
 class TrainingData:
     """
-    self.joined_data =
-    {
-        product_id: {
-            timestamp: JoinedMarketSituation {
-                sales: [(timestamp, offer_id), (timestamp, offer_id), ...],
-                merchants: {
-                    merchant_id: {
-                        offer_id: Offer { price, quality, ...}
-                    }
-                }
-            }
-        }
+    Market situations and sales are stored column-wise in typed numpy arrays, ids are integer codes and
+    timestamps are epoch milliseconds, parsed once when a line is appended:
+
+    self.situations = ColumnTable { product, timestamp }  # one row per (product_id, timestamp)
+    self.offers = ColumnTable { situation, merchant, offer, price, quality, shipping_time_standard, amount }
+    self.sales = ColumnTable { situation, offer, timestamp, price }
+
+    Offers of the initial csv merchant are stored as offers of self.merchant_id. Every sale references the
+    market situation it was joined to. Offers are grouped by situation lazily when features are extracted.
+    Sales are counted per own offer and situation when they are appended, the situations of every own offer are
+    indexed by timestamp to join sales in O(log n).
+
+    Market situations do not change once they are older than the latest timestamp, so offer groups and feature rows
+    are cached and only computed for situations that were appended since the last conversion:
+
+    self.feature_cache = {
+        product_id: CachedFeatures { covered_situations, own_rows, product specific features }
     }
+
+    The universal features are the first columns of the product specific features and never extracted separately.
+
+    The timestamps and lookup indexes are derived from the columns. After invalidate_indexes, e.g. when the columns
+    were loaded from a HistoryStore, they are rebuilt by the next append, evict or convert_training_data.
     """
 
     def __init__(self, merchant_token: str, merchant_id: str,
                  market_situations_json=None, sales_json=None):
-        self.joined_data = {}
         self.merchant_token: str = merchant_token
         self.merchant_id: str = merchant_id
-        self.timestamps: List = []
-        self.last_sale_timestamp: str = None
+        self.timestamps = numpy.zeros(0, dtype=numpy.int64)  # sorted distinct timestamps of all market situations
+        self.merged_situations: int = 0  # situations whose timestamps are merged into the timestamps
+        self.last_sale_timestamp: int = None
+
+        self.product_codes = Codebook()
+        self.merchant_codes = Codebook()
+        self.offer_codes = Codebook()
+
+        self.situations = ColumnTable({'product': numpy.int32, 'timestamp': numpy.int64})
+        self.situation_index: dict = dict()  # (product code, timestamp) -> situation
+        self.offers = ColumnTable({'situation': numpy.int32, 'merchant': numpy.int32, 'offer': numpy.int32, 'price': numpy.float64,
+                                   'quality': numpy.int16, 'shipping_time_standard': numpy.int16, 'amount': numpy.int32})
+        self.sales = ColumnTable(SALE_COLUMNS)
+        self.own_offer_sales: dict = dict()  # (situation, offer code) -> amount of sales, for all own offers
+        self.own_offer_timestamps: dict = dict()  # (product code, offer code) -> sorted timestamps of the situations of an own offer
+        self.offer_groups = OfferGroups(numpy.zeros(0, dtype=numpy.int64), numpy.zeros(1, dtype=numpy.int64), 0)
+        self.feature_cache: dict = dict()
 
         self.total_sale_events: int = 0
         self.sales_wo_ms: int = 0
         self.number_marketsituations: int = 0
 
-        self.product_prices: dict = dict()  # store all prices from sales
+        self.product_prices: dict = dict()  # product_id -> PriceStatistics of the prices of all sales
+        self.price_half_life: float = 0.0  # minutes, half life of the average sale price of new products, 0 averages all prices
+        self.export_offsets: dict = dict()  # kafka topic -> offset of the ingested part of its csv export
+        self.generation: int = 0  # incremented whenever stored rows are changed or removed instead of appended
+        self.indexes_valid: bool = True  # False after the columns were replaced until the indexes are rebuilt
+        self.checkpoint: dict = dict()  # {'id', 'rows': table or codebook -> rows} of the last save to a HistoryStore
+        self.checkpoint_evictions: dict = dict()  # table or codebook -> mask of the checkpoint rows evicted since
 
     def update_timestamps(self):
-        timestamps = set()
-        for product in self.joined_data.values():
-            for timestamp in product.keys():
-                # TODO add at right position
-                timestamps.add(timestamp)
-        self.timestamps = sorted(timestamps)
-
-    def create_training_data(self, product_id, universal_features, interval_length=5):
-        product = self.joined_data[product_id]
-        sales_vector = []
-        features_vector = []
-
-        for timestamp, joined_market_situation in product.items():
-            offer_list = self.create_offer_list(joined_market_situation)
-            self.append_to_vectors_from_features(features_vector, sales_vector, joined_market_situation, offer_list, product_id, universal_features, timestamp)
-
-        return features_vector, sales_vector
-
-    def append_to_vectors_from_features(self, features_vector, sales_vector, joined_market_situation: JoinedMarketSituation, offer_list, product_id, universal_features, timestamp):
-        if self.merchant_id in joined_market_situation.merchants:
-            for offer_id in joined_market_situation.merchants[self.merchant_id].keys():
-                amount_sales = self.extract_sales(product_id, offer_id, joined_market_situation.sales)
-                features = extract_features(offer_id, offer_list, universal_features, self.product_prices)
-                if amount_sales == 0:
-                    self.append_n_times(features_vector, sales_vector, features, 0, timestamp)
-                else:
-                    for i in range(amount_sales):
-                        self.append_n_times(features_vector, sales_vector, features, 1, timestamp)
-
-    def append_n_times(self, features_vector, sales_vector, features, sale_event: int, timestamp):
-        latest_timestamp = TimestampConverter.from_string(self.timestamps[-1])
-        current_timestamp = TimestampConverter.from_string(timestamp)
-        minutes_diff = (latest_timestamp - current_timestamp).total_seconds() / 60
-        n = 1
-        if minutes_diff < 10:
-            n = 3
-        elif minutes_diff < 60:
-            n = 2
-        for _ in range(n):
-            sales_vector.append(sale_event)
-            features_vector.append(features)
+        """
+        Merges the timestamps of the situations appended since the last call into the sorted timestamps.
+        """
+        new_timestamps = numpy.unique(self.situations['timestamp'][self.merged_situations:])
+        self.merged_situations = len(self.situations)
+        if len(new_timestamps) == 0:
+            return
+        if len(self.timestamps) == 0 or new_timestamps[0] > self.timestamps[-1]:
+            self.timestamps = numpy.concatenate((self.timestamps, new_timestamps))
+            return
+        positions = numpy.searchsorted(self.timestamps, new_timestamps)
+        is_new = self.timestamps[positions.clip(0, len(self.timestamps) - 1)] != new_timestamps
+        self.timestamps = numpy.insert(self.timestamps, positions[is_new], new_timestamps[is_new])
+
+    def create_training_data(self, product_id, universal_features, interval_length=5, recency_weighting=step_weights):
+        """
+        :param recency_weighting: function of the age of market situations in minutes to their weight
+        :return: features, sales and weights with one row per own offer and market situation,
+                 an offer that was sold n times weighs n times as much
+        """
+        own_rows, features = self.__get_features(product_id)
+        amount_sales = self.__count_sales(self.offers['situation'][own_rows], self.offers['offer'][own_rows])
+        weights = numpy.maximum(amount_sales, 1) * self.__recency_weights(self.offers['situation'][own_rows], recency_weighting)
+        features = features.copy()
+        features[:, AVERAGE_SALE_PRICE_COLUMN] = self.__average_sale_price(product_id)
+        if universal_features:
+            features = features[:, :NUM_OF_UNIVERSAL_FEATURES]
+        return features, (amount_sales > 0).astype(int), weights
+
+    def __get_features(self, product_id):
+        """
+        Extracts the features of the own offers in all situations of the product that are not cached yet.
+        The average sale price changes with every sale, so its column is left at 0 in the cache.
+        :return: offer indices of the own offers and their feature rows
+        """
+        offer_rows, situation_offsets, _ = self.__get_offer_groups()
+        cached = self.feature_cache.get(product_id)
+        first_situation = cached.covered_situations if cached else 0
+        situations = first_situation + numpy.flatnonzero(self.situations['product'][first_situation:] == self.product_codes.get(product_id))
+        offer_counts = situation_offsets[situations + 1] - situation_offsets[situations]
+        rows = offer_rows[self.__concatenate_ranges(situation_offsets[situations], offer_counts)]
+        own_offers = numpy.flatnonzero(self.offers['merchant'][rows] == self.merchant_codes.get(self.merchant_id))
+
+        features = extract_features_of_market_situations(self.offers['price'][rows], self.offers['quality'][rows],
+                                                          self.offers['shipping_time_standard'][rows],
+                                                          numpy.concatenate(([0], numpy.cumsum(offer_counts))), own_offers,
+                                                          False, 0)
+        own_rows = rows[own_offers]
+        if cached:
+            own_rows = numpy.concatenate((cached.own_rows, own_rows))
+            features = numpy.concatenate((cached.features, features))
+        self.feature_cache[product_id] = CachedFeatures(len(self.situations), own_rows, features)
+        return own_rows, features
+
+    def __recency_weights(self, situations, recency_weighting):
+        if len(situations) == 0:
+            return numpy.zeros(0)
+        minutes_diff = (self.timestamps[-1] - self.situations['timestamp'][situations]) / MILLISECONDS_PER_MINUTE
+        return recency_weighting(minutes_diff)
+
+    def __count_sales(self, situations, offers):
+        """
+        :return: amount of sales of each (situation, own offer) pair
+        """
+        return numpy.fromiter((self.own_offer_sales.get(key, 0) for key in zip(situations.tolist(), offers.tolist())),
+                              dtype=int, count=len(situations))
+
+    def __average_sale_price(self, product_id):
+        statistics = self.product_prices.get(product_id)
+        return statistics.average if statistics else 0
+
+    def __get_offer_groups(self):
+        """
+        Groups the offers appended since the last call by situation,
+        keeping the first offer if a merchant listed an offer twice in a situation
+        :return: OfferGroups with the indices of the offers in groups and the offsets of the groups of all situations
+        """
+        grouped = self.offer_groups
+        if grouped.grouped_offers == len(self.offers) and len(grouped.offsets) == len(self.situations) + 1:
+            return grouped
+        new_offers = numpy.arange(grouped.grouped_offers, len(self.offers))
+        situation, merchant, offer = self.offers['situation'][new_offers], self.offers['merchant'][new_offers], self.offers['offer'][new_offers]
+        order = numpy.lexsort((offer, merchant, situation))
+        first = numpy.ones(len(order), dtype=bool)
+        first[1:] = (situation[order][1:] != situation[order][:-1]) | (merchant[order][1:] != merchant[order][:-1]) \
+            | (offer[order][1:] != offer[order][:-1])
+        rows = numpy.sort(order[first])
+        rows = rows[numpy.argsort(situation[rows], kind='stable')]
+        offsets = numpy.searchsorted(situation[rows], numpy.arange(len(grouped.offsets), len(self.situations) + 1)) + len(grouped.rows)
+        self.offer_groups = OfferGroups(numpy.concatenate((grouped.rows, new_offers[rows])), numpy.concatenate((grouped.offsets, offsets)),
+                                        len(self.offers))
+        return self.offer_groups
+
+    def __reset_caches(self):
+        self.offer_groups = OfferGroups(numpy.zeros(0, dtype=numpy.int64), numpy.zeros(1, dtype=numpy.int64), 0)
+        self.feature_cache = dict()
+
+    @staticmethod
+    def __concatenate_ranges(starts, lengths):
+        if len(lengths) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        range_starts = numpy.cumsum(lengths) - lengths
+        return numpy.repeat(starts - range_starts, lengths) + numpy.arange(lengths.sum())
+
+    def iterate_joined_market_situations(self):
+        """
+        Restores the market situations with their sales as objects, one situation at a time
+        :return: generator of (product_id, timestamp, JoinedMarketSituation)
+        """
+        self.update_indexes()
+        offer_rows, situation_offsets, _ = self.__get_offer_groups()
+        sales_order = numpy.argsort(self.sales['situation'], kind='stable')
+        sales_offsets = numpy.searchsorted(self.sales['situation'][sales_order], numpy.arange(len(self.situations) + 1))
+        for situation in range(len(self.situations)):
+            product_id = self.product_codes.decode(self.situations['product'][situation])
+            joined_market_situation = JoinedMarketSituation()
+            for row in offer_rows[situation_offsets[situation]:situation_offsets[situation + 1]]:
+                merchant_id = self.merchant_codes.decode(self.offers['merchant'][row])
+                offer_id = self.offer_codes.decode(self.offers['offer'][row])
+                joined_market_situation.merchants.setdefault(merchant_id, {})[offer_id] = Offer(
+                    int(self.offers['amount'][row]), merchant_id, offer_id, float(self.offers['price'][row]), '', product_id,
+                    int(self.offers['quality'][row]), {'standard': int(self.offers['shipping_time_standard'][row])}, '', product_id)
+            for sale in sales_order[sales_offsets[situation]:sales_offsets[situation + 1]]:
+                joined_market_situation.sales.append((TimestampConverter.to_string(self.sales['timestamp'][sale]),
+                                                      self.offer_codes.decode(self.sales['offer'][sale])))
+            yield product_id, TimestampConverter.to_string(self.situations['timestamp'][situation]), joined_market_situation
 
     @staticmethod
     def create_offer_list(joined_market_situation: JoinedMarketSituation):
@@ -93,157 +226,418 @@ class TrainingData:
             offer_list.extend(offers.values())
         return offer_list
 
-    def convert_training_data(self, universal_features=False):
+    def convert_training_data(self, universal_features=False, recency_weighting=step_weights, aggregate_rows=False):
+        """
+        :param aggregate_rows: collapse identical rows of a product into one row weighted by their summed weights
+        """
+        self.update_indexes()
         converted = dict()
-        for product_id in self.joined_data.keys():
-            new_training_data = self.create_training_data(product_id, universal_features)
+        amount_rows = 0
+        for product_id in self.product_codes.values:
+            new_training_data = self.create_training_data(product_id, universal_features, recency_weighting=recency_weighting)
             # check if at least one sale event is positive
             if 1 in new_training_data[1]:
-                converted[product_id] = new_training_data
+                amount_rows += len(new_training_data[1])
+                converted[product_id] = aggregate_identical_rows(*new_training_data) if aggregate_rows else new_training_data
+        if aggregate_rows and amount_rows:
+            amount_unique_rows = sum(len(sales) for _, sales, _ in converted.values())
+            logging.info('Aggregated {} training rows into {} unique rows (compression ratio {:.2f})'
+                         .format(amount_rows, amount_unique_rows, amount_rows / amount_unique_rows))
         return converted
 
+    @staticmethod
+    def select_universal_features(converted: dict):
+        """
+        :param converted: product specific training data of convert_training_data()
+        :return: the training data of the universal model, the feature matrices are views of the converted ones
+        """
+        return {product_id: (features[:, :NUM_OF_UNIVERSAL_FEATURES], sales, weights)
+                for product_id, (features, sales, weights) in converted.items()}
+
     @staticmethod
     def extract_sales(product_id, offer_id, sales: List):
         if not sales:
             return 0
         return [x[1] for x in sales].count(offer_id)
 
-    def print_info(self):
-        counter_ms = 0
-        counter_s = 0
+    def evict(self, retention_minutes: float = 0.0, max_situations_per_product: int = 0) -> int:
+        """
+        Drops the market situations older than retention_minutes before the last timestamp and all but the latest
+        max_situations_per_product situations of each product, together with their offers and sales. The prices of
+        evicted sales are removed from product_prices. A limit of 0 disables it.
+        :return: amount of evicted market situations
+        """
+        self.update_indexes()
+        self.update_timestamps()
+        products, timestamps = self.situations['product'], self.situations['timestamp']
+        keep = numpy.ones(len(timestamps), dtype=bool)
+        if retention_minutes > 0 and len(self.timestamps) > 0:
+            keep &= timestamps >= self.timestamps[-1] - retention_minutes * MILLISECONDS_PER_MINUTE
+        if max_situations_per_product > 0:
+            order = numpy.lexsort((-timestamps, products))
+            starts = numpy.flatnonzero(numpy.r_[True, products[order][1:] != products[order][:-1]])
+            ranks = numpy.arange(len(order)) - numpy.repeat(starts, numpy.diff(numpy.r_[starts, len(order)]))
+            keep[order[ranks >= max_situations_per_product]] = False
+        evicted = int(len(keep) - numpy.count_nonzero(keep))
+        if evicted == 0:
+            return 0
 
-        for product in self.joined_data.values():
-            for situation in product.values():
-                counter_s += len(situation.sales)
-                for merchant in situation.merchants.values():
-                    counter_ms += len(merchant)
+        evicted_sales = ~keep[self.sales['situation']]
+        evicted_products = products[self.sales['situation'][evicted_sales]]
+        for product in numpy.unique(evicted_products):
+            statistics = self.product_prices.get(self.product_codes.decode(product))
+            if statistics:
+                statistics.remove(self.sales['price'][evicted_sales][evicted_products == product],
+                                  self.sales['timestamp'][evicted_sales][evicted_products == product])
+
+        new_situations = numpy.cumsum(keep) - 1
+        self.__record_eviction('offers', keep[self.offers['situation']])
+        self.__record_eviction('sales', keep[self.sales['situation']])
+        for table in [self.offers, self.sales]:
+            table.compress(keep[table['situation']])
+            table['situation'][:] = new_situations[table['situation']]
+        self.__record_eviction('situations', keep)
+        self.situations.compress(keep)
+        self.__compress_offer_codes()
+        self.rebuild_indexes()
+        self.number_marketsituations = len(self.timestamps)
+        self.generation += 1
+        return evicted
+
+    def __record_eviction(self, name: str, keep):
+        """
+        Marks the evicted rows among the rows of the last checkpoint, so a HistoryStore only records them as evicted
+        :param keep: mask of the current rows of the table or codebook
+        """
+        checkpoint_rows = self.checkpoint.get('rows', {}).get(name, 0)
+        if checkpoint_rows == 0:
+            return
+        evicted = self.checkpoint_evictions.setdefault(name, numpy.zeros(checkpoint_rows, dtype=bool))
+        remaining = numpy.flatnonzero(~evicted)
+        evicted[remaining[~keep[:len(remaining)]]] = True
+
+    def __compress_offer_codes(self):
+        used_codes = numpy.unique(numpy.concatenate((self.offers['offer'], self.sales['offer'])))
+        keep = numpy.zeros(len(self.offer_codes), dtype=bool)
+        keep[used_codes] = True
+        self.__record_eviction('offer_codes', keep)
+        offer_codes = Codebook()
+        for code in used_codes.tolist():
+            offer_codes.encode(self.offer_codes.decode(code))
+        new_codes = numpy.full(len(self.offer_codes), -1, dtype=numpy.int32)
+        new_codes[used_codes] = numpy.arange(len(used_codes))
+        for table in [self.offers, self.sales]:
+            table['offer'][:] = new_codes[table['offer']]
+        self.offer_codes = offer_codes
+
+    def invalidate_indexes(self):
+        """
+        Marks the timestamps and lookup indexes as outdated after the columns were replaced
+        """
+        self.indexes_valid = False
+
+    def update_indexes(self):
+        """
+        Rebuilds the timestamps and lookup indexes if they were invalidated
+        """
+        if not self.indexes_valid:
+            self.rebuild_indexes()
+
+    def rebuild_indexes(self):
+        """
+        Rebuilds the timestamps, all lookup indexes and caches from the columns
+        """
+        products, timestamps = self.situations['product'].tolist(), self.situations['timestamp'].tolist()
+        self.situation_index = dict(zip(zip(products, timestamps), range(len(products))))
+        own_merchant = self.merchant_codes.get(self.merchant_id)
+        own_offers = self.offers['merchant'] == own_merchant
+        self.own_offer_sales = dict.fromkeys(zip(self.offers['situation'][own_offers].tolist(), self.offers['offer'][own_offers].tolist()), 0)
+        self.own_offer_timestamps = dict()
+        for situation, offer in self.own_offer_sales:
+            self.own_offer_timestamps.setdefault((products[situation], offer), []).append(timestamps[situation])
+        for offer_timestamps in self.own_offer_timestamps.values():
+            offer_timestamps.sort()
+        for key in zip(self.sales['situation'].tolist(), self.sales['offer'].tolist()):
+            self.own_offer_sales[key] = self.own_offer_sales.get(key, 0) + 1
+        self.timestamps = numpy.unique(self.situations['timestamp'])
+        self.merged_situations = len(self.situations)
+        self.__reset_caches()
+        self.indexes_valid = True
+
+    def watermark(self) -> dict:
+        """
+        :return: identifies the stored rows, it changes whenever rows are appended, changed or removed
+        """
+        return {'generation': self.generation, 'situations': len(self.situations), 'offers': len(self.offers), 'sales': len(self.sales)}
 
+    def print_info(self):
         self.number_marketsituations = len(self.timestamps)
+        if self.number_marketsituations == 0:
+            print('\nTraining data: no market situations\n')
+            return
 
         print('\nTraining data: \n\tEntries market_situations: {} \
                \n\tEntries sales: {} \
                \n\tDistinct timestamps: {} \
                \n\tFirst timestamp: {} \
                \n\tLast timestamp: {} \n\
-               '.format(counter_ms, counter_s,
-                        len(self.timestamps), self.timestamps[0], self.timestamps[-1]))
+               '.format(len(self.__get_offer_groups().rows), len(self.sales),
+                        len(self.timestamps), TimestampConverter.to_string(self.timestamps[0]), TimestampConverter.to_string(self.timestamps[-1])))
 
     def append_marketplace_situations(self, line, csv_merchant_id=None):
         merchant_id = line['merchant_id']
         if csv_merchant_id == merchant_id:
             merchant_id = self.merchant_id
 
-        if len(self.timestamps) > 0 and line['timestamp'] <= self.timestamps[-1]:
+        timestamp = TimestampConverter.to_epoch_ms(line['timestamp'])
+        if len(self.timestamps) > 0 and timestamp <= self.timestamps[-1]:
+            return
+        self.__add_offer(line['product_id'], timestamp, merchant_id, line['offer_id'], line['price'], line['quality'],
+                         line['shipping_time_standard'], line['amount'])
+
+    def append_marketplace_situation_chunk(self, chunk: pandas.DataFrame, csv_merchant_id=None):
+        """
+        Appends a chunk of market situation lines like append_marketplace_situations, but column-wise
+        """
+        timestamps = TimestampConverter.to_epoch_ms_array(chunk['timestamp'])
+        if len(self.timestamps) > 0:
+            is_new = timestamps > self.timestamps[-1]
+            chunk, timestamps = chunk[is_new], timestamps[is_new]
+        if len(chunk) == 0:
             return
-        self.prepare_joined_data(line['product_id'], line['timestamp'], merchant_id)
-        merchant = self.joined_data[line['product_id']][line['timestamp']].merchants[merchant_id]
-        if line['offer_id'] not in merchant:
-            merchant[line['offer_id']] = Offer(line['amount'], line['merchant_id'], line['offer_id'], line['price'],
-                                               line['prime'], line['product_id'], line['quality'],
-                                               {'standard': line['shipping_time_standard'], 'prime': line['shipping_time_prime']},
-                                               '', line['uid'])
-
-    def prepare_joined_data(self, product_id: str, timestamp: str, merchant_id=None):
-        if product_id not in self.joined_data:
-            self.joined_data[product_id] = {}
-        if timestamp not in self.joined_data[product_id]:
-            self.joined_data[product_id][timestamp] = JoinedMarketSituation()
-        if merchant_id and merchant_id not in self.joined_data[product_id][timestamp].merchants:
-            self.joined_data[product_id][timestamp].merchants[merchant_id] = {}
+        merchant_ids = chunk['merchant_id'].to_numpy(dtype=object)
+        if csv_merchant_id is not None:
+            merchant_ids = numpy.where(merchant_ids == csv_merchant_id, self.merchant_id, merchant_ids)
+        products = self.product_codes.encode_array(chunk['product_id'])
+        merchants = self.merchant_codes.encode_array(merchant_ids)
+        offers = self.offer_codes.encode_array(chunk['offer_id'])
+
+        # situations are added in the order they appear in the chunk
+        keys, first_rows, key_indices = numpy.unique(numpy.stack((products, timestamps), axis=1), axis=0, return_index=True, return_inverse=True)
+        keys = keys[numpy.argsort(first_rows)]
+        key_situations = numpy.array([self.situation_index.get(key, -1) for key in zip(keys[:, 0].tolist(), keys[:, 1].tolist())], dtype=numpy.int64)
+        new_keys = numpy.flatnonzero(key_situations == -1)
+        key_situations[new_keys] = len(self.situations) + numpy.arange(len(new_keys))
+        self.situations.extend(product=keys[new_keys, 0], timestamp=keys[new_keys, 1])
+        self.situation_index.update(zip(zip(keys[new_keys, 0].tolist(), keys[new_keys, 1].tolist()), key_situations[new_keys].tolist()))
+        situations = numpy.empty(len(keys), dtype=numpy.int64)
+        situations[numpy.argsort(first_rows)] = key_situations
+        situations = situations[key_indices.ravel()]
+
+        self.offers.extend(situation=situations, merchant=merchants, offer=offers, price=pandas.to_numeric(chunk['price']).to_numpy(),
+                           quality=pandas.to_numeric(chunk['quality']).to_numpy(),
+                           shipping_time_standard=pandas.to_numeric(chunk['shipping_time_standard']).to_numpy(),
+                           amount=pandas.to_numeric(chunk['amount']).to_numpy())
+        own_rows = numpy.flatnonzero(merchants == self.merchant_codes.get(self.merchant_id))
+        own_rows = own_rows[numpy.unique(numpy.stack((situations[own_rows], offers[own_rows]), axis=1), axis=0, return_index=True)[1]]
+        for situation, offer, product, timestamp in zip(situations[own_rows].tolist(), offers[own_rows].tolist(),
+                                                        products[own_rows].tolist(), timestamps[own_rows].tolist()):
+            self.__index_own_offer(situation, product, offer, timestamp)
+        if situations.min() < len(self.offer_groups.offsets) - 1:
+            # a situation that was already grouped changed
+            self.__reset_caches()
+
+    def __get_or_add_situation(self, product_id: str, timestamp: int):
+        key = (self.product_codes.encode(product_id), int(timestamp))
+        situation = self.situation_index.get(key)
+        if situation is None:
+            situation = self.situations.append(product=key[0], timestamp=key[1])
+            self.situation_index[key] = situation
+        return situation
+
+    def __get_situation(self, product_id: str, timestamp: int):
+        return self.situation_index.get((self.product_codes.get(product_id), int(timestamp)))
+
+    def __add_offer(self, product_id: str, timestamp: int, merchant_id: str, offer_id: str, price, quality, shipping_time_standard, amount):
+        situation = self.__get_or_add_situation(product_id, timestamp)
+        offer = self.offer_codes.encode(offer_id)
+        self.offers.append(situation=situation, merchant=self.merchant_codes.encode(merchant_id), offer=offer, price=float(price),
+                           quality=int(quality), shipping_time_standard=int(shipping_time_standard), amount=int(amount))
+        if merchant_id == self.merchant_id:
+            self.__index_own_offer(situation, self.product_codes.get(product_id), offer, timestamp)
+        if situation < len(self.offer_groups.offsets) - 1:
+            # a situation that was already grouped changed
+            self.__reset_caches()
+
+    def __index_own_offer(self, situation: int, product: int, offer: int, timestamp: int):
+        if (situation, offer) not in self.own_offer_sales:
+            self.own_offer_sales[(situation, offer)] = 0
+            bisect.insort(self.own_offer_timestamps.setdefault((product, offer), []), timestamp)
+
+    def __add_sale(self, situation: int, offer_id: str, timestamp: int, price: float):
+        offer = self.offer_codes.encode(offer_id)
+        self.sales.append(situation=situation, offer=offer, timestamp=timestamp, price=price)
+        self.own_offer_sales[(situation, offer)] = self.own_offer_sales.get((situation, offer), 0) + 1
 
     def append_sales(self, line: dict):
-        if self.last_sale_timestamp and line['timestamp'] <= self.last_sale_timestamp:
+        timestamp = TimestampConverter.to_epoch_ms(line['timestamp'])
+        index = int(numpy.searchsorted(self.timestamps, timestamp, side='right')) - 1
+        self.__append_sale(line['product_id'], line['offer_id'], timestamp, float(line['price']), index)
+
+    def append_sales_chunk(self, chunk: pandas.DataFrame):
+        """
+        Appends a chunk of sale lines like append_sales, the timestamps and prices are parsed column-wise
+        """
+        timestamps = TimestampConverter.to_epoch_ms_array(chunk['timestamp'])
+        indices = numpy.searchsorted(self.timestamps, timestamps, side='right') - 1
+        for product_id, offer_id, timestamp, price, index in zip(chunk['product_id'].tolist(), chunk['offer_id'].tolist(), timestamps.tolist(),
+                                                                  pandas.to_numeric(chunk['price']).tolist(), indices.tolist()):
+            self.__append_sale(product_id, offer_id, timestamp, float(price), index)
+
+    def __append_sale(self, product_id: str, offer_id: str, timestamp: int, price: float, index: int):
+        """
+        :param index: index of the latest timestamp not after the sale
+        """
+        if self.last_sale_timestamp and timestamp <= self.last_sale_timestamp:
             return
-        index = bisect.bisect(self.timestamps, line['timestamp']) - 1
         if index < 0:
             return
 
-        index = self.find_index_of_corresponding_market_situation(index, line['product_id'], line['offer_id'])
+        index = self.find_index_of_corresponding_market_situation(index, product_id, offer_id)
 
         self.total_sale_events += 1
         if index != -1:
-            timestamp = self.timestamps[index]
-            self.last_sale_timestamp = line['timestamp']
+            self.last_sale_timestamp = timestamp
+            self.__add_sale(self.__get_situation(product_id, self.timestamps[index]), offer_id, timestamp, price)
 
-            self.prepare_joined_data(line['product_id'], timestamp)
-
-            interval = self.joined_data[line['product_id']][timestamp]
-            interval.sales.append((line['timestamp'], line['offer_id']))
-
-            # add price to price list
-            self.add_product_price(line['product_id'], line['price'])
+            # add price to the price statistics
+            self.add_product_price(product_id, price, timestamp)
         else:
             self.sales_wo_ms += 1
             logging.warning("Did not find a corresponding market situation for sale event! Ignore...   (" + str(self.sales_wo_ms) + "/" + str(self.total_sale_events) + ")")
 
-    def add_product_price(self, product_id: str, price: str):
+    def add_product_price(self, product_id: str, price, timestamp: int = None):
         if product_id not in self.product_prices:
-            self.product_prices[product_id] = []
-        self.product_prices[product_id].append(float(price))
+            self.product_prices[product_id] = PriceStatistics(self.price_half_life)
+        self.product_prices[product_id].add(float(price), timestamp)
 
     def find_index_of_corresponding_market_situation(self, index: int, product_id: str, offer_id: str):
-        if self.test_index(index, product_id, offer_id):
-            return index
-        for i in range(1, 11):
-            if index - 1 >= 0 and self.test_index(index - 1, product_id, offer_id):
-                return index - i
-            if index + i < len(self.timestamps) and self.test_index(index + 1, product_id, offer_id):
-                return index + i
-        return -1
+        """
+        :return: the index of the timestamp closest to the given index at which the own offer was on the market, earlier timestamps
+                 win ties, or -1 if there is none within MAX_SALE_DISTANCE timestamps
+        """
+        offer_timestamps = self.own_offer_timestamps.get((self.product_codes.get(product_id), self.offer_codes.get(offer_id)))
+        if not offer_timestamps:
+            return -1
+        position = bisect.bisect_right(offer_timestamps, self.timestamps[index])
+        closest_index, distance = -1, MAX_SALE_DISTANCE + 1
+        if position > 0:
+            previous_index = int(numpy.searchsorted(self.timestamps, offer_timestamps[position - 1]))
+            closest_index, distance = previous_index, index - previous_index
+        if position < len(offer_timestamps):
+            next_index = int(numpy.searchsorted(self.timestamps, offer_timestamps[position]))
+            if next_index - index < distance and next_index < len(self.timestamps):
+                closest_index, distance = next_index, next_index - index
+        return closest_index if distance <= MAX_SALE_DISTANCE else -1
 
     def test_index(self, index: int, product_id: str, offer_id: str):
-        if product_id in self.joined_data \
-                and self.timestamps[index] in self.joined_data[product_id] \
-                and self.merchant_id in self.joined_data[product_id][self.timestamps[index]].merchants \
-                and offer_id in self.joined_data[product_id][self.timestamps[index]].merchants[self.merchant_id]:
-            return True
-        else:
-            return False
+        situation = self.__get_situation(product_id, self.timestamps[index])
+        return situation is not None and (situation, self.offer_codes.get(offer_id)) in self.own_offer_sales
+
+    def __setstate__(self, state):
+        if 'joined_data' not in state:
+            self.__dict__.update(state)
+            self.__migrate_product_prices()
+            return
+        # migrate pickles of the former object based store
+        self.__init__(state['merchant_token'], state['merchant_id'])
+        self.product_prices = state['product_prices']
+        self.__migrate_product_prices()
+        for product_id, joined_market_situations in state['joined_data'].items():
+            for timestamp, joined_market_situation in joined_market_situations.items():
+                timestamp = TimestampConverter.to_epoch_ms(timestamp)
+                situation = self.__get_or_add_situation(product_id, timestamp)
+                for merchant_id, offers in joined_market_situation.merchants.items():
+                    for offer in offers.values():
+                        self.__add_offer(product_id, timestamp, merchant_id, offer.offer_id, offer.price, offer.quality,
+                                         offer.shipping_time['standard'], offer.amount)
+                for sale_timestamp, offer_id in joined_market_situation.sales:
+                    self.__add_sale(situation, offer_id, TimestampConverter.to_epoch_ms(sale_timestamp), self.__average_sale_price(product_id))
+        self.update_timestamps()
+        if state['last_sale_timestamp']:
+            self.last_sale_timestamp = TimestampConverter.to_epoch_ms(state['last_sale_timestamp'])
+        for key in ['total_sale_events', 'sales_wo_ms', 'number_marketsituations']:
+            setattr(self, key, state[key])
+
+    def __migrate_product_prices(self):
+        """
+        Older pickles store lists of all sale prices and no price per sale,
+        these sales are assumed to be sold at the average price of their product
+        """
+        self.__dict__.setdefault('price_half_life', 0.0)
+        self.__dict__.setdefault('export_offsets', dict())
+        self.__dict__.setdefault('generation', 0)
+        self.__dict__.setdefault('indexes_valid', True)
+        self.__dict__.setdefault('checkpoint', dict())
+        self.__dict__.setdefault('checkpoint_evictions', dict())
+        for product_id, prices in self.product_prices.items():
+            if isinstance(prices, list):
+                self.product_prices[product_id] = PriceStatistics.from_prices(prices)
+        if 'price' not in self.sales.columns:
+            columns = {name: self.sales[name] for name in self.sales.columns}
+            products = self.situations['product'][columns['situation']]
+            self.sales = ColumnTable(SALE_COLUMNS)
+            self.sales.extend(price=[self.__average_sale_price(self.product_codes.decode(product)) for product in products.tolist()], **columns)
+
+    def __mark_appended(self) -> dict:
+        """
+        :return: the lengths and sale statistics to restore with __undo_appended
+        """
+        return {'lengths': {name: len(getattr(self, name)) for name in APPENDED},
+                'scalars': {key: getattr(self, key) for key in SALE_SCALARS},
+                'product_prices': {product_id: copy.copy(statistics) for product_id, statistics in self.product_prices.items()}}
+
+    def __undo_appended(self, appended: dict):
+        """
+        Removes the rows appended since __mark_appended and rebuilds the indexes from the remaining rows
+        """
+        for name, length in appended['lengths'].items():
+            getattr(self, name).truncate(length)
+        self.__dict__.update(appended['scalars'])
+        self.product_prices = appended['product_prices']
+        self.rebuild_indexes()
 
     def append_by_csvs(self, market_situations_path, buy_offer_path, csv_merchant_id=None):
-        with open(market_situations_path, 'r') as csvfile:
-            has_header = csv.Sniffer().has_header(csvfile.read(16384))
-            csvfile.seek(0)
-            if has_header:
-                situation_data = csv.DictReader(csvfile)
-            else:
-                situation_data = csv.DictReader(csvfile, fieldnames=get_market_situation_fieldnames())
-            for line in situation_data:
-                self.append_marketplace_situations(line, csv_merchant_id)
+        self.update_indexes()
+        for chunk in read_csv_chunks(market_situations_path, get_market_situation_fieldnames(), ID_DTYPES):
+            self.append_marketplace_situation_chunk(chunk, csv_merchant_id)
         self.update_timestamps()
-        with open(buy_offer_path, 'r') as csvfile:
-            has_header = csv.Sniffer().has_header(csvfile.read(16384))
-            csvfile.seek(0)
-            if has_header:
-                buy_offer_data = csv.DictReader(csvfile)
-            else:
-                buy_offer_data = csv.DictReader(csvfile, fieldnames=get_buy_offer_fieldnames())
-            for line in buy_offer_data:
-                self.append_sales(line)
+        for chunk in read_csv_chunks(buy_offer_path, get_buy_offer_fieldnames(), ID_DTYPES):
+            self.append_sales_chunk(chunk)
         self.print_info()
 
-    def append_by_kafka(self, kafka_url, market_situations_path=None, buy_offer_path=None):
+    def append_by_kafka(self, kafka_url, market_situations_path=None, buy_offer_path=None, incremental=True):
+        """
+        :param incremental: only download the lines appended to the exports since the last call
+        """
         ########## use kafka example files
         if market_situations_path and buy_offer_path:
             self.append_by_csvs(market_situations_path, buy_offer_path)
             return
         #############
 
+        self.update_indexes()
         try:
-            ms, bo = download_kafka_files(self.merchant_token, kafka_url)
-
+            ms, bo = download_kafka_files(self.merchant_token, kafka_url, self.export_offsets if incremental else None)
         except Exception as e:
             logging.warning('Could not download data from kafka: {}'.format(e))
             return
-        if ms.status_code != 200 or bo.status_code != 200 or len(ms.text) < 10 or len(bo.text) < 10:
-            logging.warning('Kafka download failed')
-            return
 
-        situation_data = csv.DictReader(ms.text.split('\n'))
-        for line in situation_data:
-            self.append_marketplace_situations(line)
-        self.update_timestamps()
-        buy_offer_data = csv.DictReader(bo.text.split('\n'))
-        for line in buy_offer_data:
-            self.append_sales(line)
+        # the exports are parsed while they are downloaded, a failure undoes the chunks appended before it
+        # so the next refresh can ingest the same lines again
+        appended = self.__mark_appended()
+        try:
+            for chunk in read_csv_chunks(ms, get_market_situation_fieldnames(), ID_DTYPES, has_header=True):
+                self.append_marketplace_situation_chunk(chunk)
+            self.update_timestamps()
+            for chunk in read_csv_chunks(bo, get_buy_offer_fieldnames(), ID_DTYPES, has_header=True):
+                self.append_sales_chunk(chunk)
+        except Exception as e:
+            logging.warning('Kafka download failed: {}'.format(e))
+            self.__undo_appended(appended)
+            return
+        finally:
+            ms.close()
+            bo.close()
+        self.export_offsets.update(marketSituation=ms.offset, buyOffer=bo.offset)
         self.print_info()
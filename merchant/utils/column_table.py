@@ -0,0 +1,135 @@
+import numpy
+import pandas
+
+
+class ColumnTable:
+    """
+    Append-only table of typed numpy columns. Single rows are buffered in lists and moved into the columns
+    on the next read, the columns are over-allocated and double their capacity when full.
+    """
+
+    def __init__(self, dtypes: dict, capacity=1024):
+        self.length = 0  # rows moved into the columns
+        self.columns = {name: numpy.empty(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+        self.pending = {name: [] for name in dtypes}
+
+    def append(self, **values):
+        for name, pending in self.pending.items():
+            pending.append(values[name])
+        return len(self) - 1
+
+    def extend(self, **arrays):
+        self.__flush()
+        amount = len(next(iter(arrays.values())))
+        self.__reserve(self.length + amount)
+        for name, column in self.columns.items():
+            column[self.length:self.length + amount] = arrays[name]
+        self.length += amount
+
+    def use_columns(self, **arrays):
+        """
+        Replaces all rows by the given arrays without copying them, e.g. by memory-mapped columns.
+        They are copied into over-allocated columns when the next rows are appended.
+        """
+        self.columns = {name: arrays[name] for name in self.columns}
+        self.pending = {name: [] for name in self.columns}
+        self.length = len(next(iter(arrays.values())))
+
+    def compress(self, keep):
+        """
+        Removes all rows whose entry in the boolean array keep is False, the remaining rows keep their order
+        """
+        self.__flush()
+        for name, column in self.columns.items():
+            remaining = column[:self.length][keep]
+            column[:len(remaining)] = remaining
+        self.length = int(numpy.count_nonzero(keep))
+
+    def truncate(self, length: int):
+        """
+        Removes all rows from the given row on
+        """
+        self.__flush()
+        self.length = min(self.length, length)
+
+    def __getitem__(self, name):
+        self.__flush()
+        return self.columns[name][:self.length]
+
+    def __len__(self):
+        return self.length + len(next(iter(self.pending.values())))
+
+    def __flush(self):
+        amount = len(next(iter(self.pending.values())))
+        if amount == 0:
+            return
+        self.__reserve(self.length + amount)
+        for name, column in self.columns.items():
+            column[self.length:self.length + amount] = self.pending[name]
+            self.pending[name].clear()
+        self.length += amount
+
+    def __reserve(self, size):
+        capacity = len(next(iter(self.columns.values())))
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for name, column in self.columns.items():
+            grown = numpy.empty(capacity, dtype=column.dtype)
+            grown[:self.length] = column[:self.length]
+            self.columns[name] = grown
+
+    def __getstate__(self):
+        self.__flush()
+        state = self.__dict__.copy()
+        state['columns'] = {name: column[:self.length].copy() for name, column in self.columns.items()}
+        return state
+
+
+class Codebook:
+    """
+    Maps strings to consecutive integer codes in the order they were seen first
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    @staticmethod
+    def from_values(values: list):
+        codebook = Codebook()
+        codebook.values = values
+        codebook.codes = dict(zip(values, range(len(values))))
+        return codebook
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def encode_array(self, values) -> numpy.ndarray:
+        """
+        Encodes an array of strings, every distinct value is looked up once
+        """
+        codes, distinct_values = pandas.factorize(numpy.asarray(values, dtype=object))
+        return numpy.array([self.encode(value) for value in distinct_values], dtype=numpy.int64)[codes]
+
+    def truncate(self, length: int):
+        """
+        Forgets all values from the given code on
+        """
+        for value in self.values[length:]:
+            del self.codes[value]
+        del self.values[length:]
+
+    def get(self, value: str, default=-1) -> int:
+        return self.codes.get(value, default)
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
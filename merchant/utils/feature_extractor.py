@@ -1,6 +1,13 @@
 from typing import List
 
+import numpy
+
 from merchant_sdk.models import Offer
+from utils.price_statistics import PriceStatistics
+
+# the universal features are the first columns of the product specific features
+NUM_OF_UNIVERSAL_FEATURES = 5
+NUM_OF_PRODUCT_SPECIFIC_FEATURES = 14
 
 
 def extract_features(offer_id: str, offer_list: List[Offer], universal_features: bool, product_prices: dict):
@@ -10,6 +17,108 @@ def extract_features(offer_id: str, offer_list: List[Offer], universal_features:
         return __extract_product_specific_features(offer_id, offer_list, product_prices)
 
 
+def extract_features_for_prices(offer_id: str, offer_list: List[Offer], potential_prices, universal_features: bool, product_prices: dict):
+    """
+    Extracts the features of one market situation for every potential price of the given offer at once
+    :return: numpy matrix with one row per potential price, rows are equal to extract_features with the offer set to that price
+    """
+    current_offer: Offer = [x for x in offer_list if offer_id == x.offer_id][0]
+    other_offers: List = [x for x in offer_list if offer_id != x.offer_id]
+
+    prices = numpy.asarray(potential_prices, dtype=float)
+    other_prices = numpy.sort(numpy.array([float(x.price) for x in other_offers], dtype=float))
+
+    price_ranks = numpy.searchsorted(other_prices, prices, side='left') + 1
+    price_differences = __calculate_price_differences_for_prices(prices, other_prices)
+
+    columns = [price_ranks,  # price_rank
+               numpy.full(len(prices), len(offer_list)),  # amount_offers
+               price_differences[1],  # price_diff_to_min_in_%
+               price_differences[3],  # price_diff_to_2nd_min_in_%
+               price_differences[5],  # price_diff_to_3rd_min_in_%
+               ]
+    if not universal_features:
+        columns += [prices,  # price
+                    numpy.full(len(prices), int(current_offer.quality)),  # quality
+                    numpy.full(len(prices), int(current_offer.shipping_time['standard'])),  # shipping_time
+                    numpy.full(len(prices), __calculate_average_price(other_offers)),  # avg_price
+                    (other_prices.sum() + prices) / len(offer_list),  # avg_price_with_current_offer
+                    numpy.full(len(prices), average_sale_price(product_prices, current_offer.product_id)),  # average sale prices
+                    price_differences[0],  # price_diff_to_min
+                    price_differences[2],  # price_diff_to_2nd_min
+                    price_differences[4]  # price_diff_to_3rd_min
+                    ]
+    return numpy.column_stack(columns)
+
+
+def extract_features_of_market_situations(prices, qualities, shipping_times, situation_offsets, own_offers, universal_features: bool,
+                                          average_sale_price: float):
+    """
+    Extracts the features of many offers in many market situations at once
+    :param prices: prices of all offers, grouped by market situation
+    :param situation_offsets: the offers of situation i are at situation_offsets[i]:situation_offsets[i + 1]
+    :param own_offers: indices of the offers to extract the features for
+    :return: numpy matrix with one row per own offer, rows are equal to extract_features of the offer in its situation
+    """
+    prices = numpy.asarray(prices, dtype=float)
+    own_offers = numpy.asarray(own_offers, dtype=numpy.int64)
+    if len(own_offers) == 0:
+        return numpy.empty((0, NUM_OF_UNIVERSAL_FEATURES if universal_features else NUM_OF_PRODUCT_SPECIFIC_FEATURES))
+    offer_counts = numpy.diff(situation_offsets)
+    situation_starts = numpy.asarray(situation_offsets[:-1], dtype=numpy.int64)
+    situation_of_offer = numpy.repeat(numpy.arange(len(offer_counts)), offer_counts)
+
+    # sort the offers by price within every situation, the situation boundaries stay the same
+    order = numpy.lexsort((prices, situation_of_offer))
+    sorted_prices = prices[order]
+    sorted_positions = numpy.empty(len(order), dtype=numpy.int64)
+    sorted_positions[order] = numpy.arange(len(order))
+    new_price = numpy.ones(len(order), dtype=bool)
+    new_price[1:] = (situation_of_offer[order][1:] != situation_of_offer[order][:-1]) | (sorted_prices[1:] != sorted_prices[:-1])
+    first_of_equal_price = numpy.maximum.accumulate(numpy.where(new_price, numpy.arange(len(order)), 0))
+
+    situation = situation_of_offer[own_offers]
+    start = situation_starts[situation]
+    amount_offers = offer_counts[situation]
+    amount_other_offers = amount_offers - 1
+    position = sorted_positions[own_offers] - start
+    current_prices = prices[own_offers]
+
+    price_ranks = first_of_equal_price[sorted_positions[own_offers]] - start + 1
+    max_other_price = sorted_prices[numpy.where(position == amount_offers - 1, start + amount_offers - 2, start + amount_offers - 1)]
+    price_differences = []
+    for i in [0, 1, 2]:
+        exists = amount_other_offers > i
+        ith_price = sorted_prices[numpy.where(exists, start + i + (i >= position), 0)]
+        diffs = __calculate_price_difference_for_prices(current_prices, ith_price, max_other_price)
+        price_differences.extend([numpy.where(exists, diff, 0.) for diff in diffs])
+
+    columns = [price_ranks,  # price_rank
+               amount_offers,  # amount_offers
+               price_differences[1],  # price_diff_to_min_in_%
+               price_differences[3],  # price_diff_to_2nd_min_in_%
+               price_differences[5],  # price_diff_to_3rd_min_in_%
+               ]
+    if not universal_features:
+        situation_sums = numpy.zeros(len(offer_counts))
+        non_empty = offer_counts > 0
+        if non_empty.any():
+            situation_sums[non_empty] = numpy.add.reduceat(prices, situation_starts[non_empty])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            average_other_prices = numpy.where(amount_other_offers > 0, (situation_sums[situation] - current_prices) / amount_other_offers, 0.)
+        columns += [current_prices,  # price
+                    numpy.asarray(qualities)[own_offers],  # quality
+                    numpy.asarray(shipping_times)[own_offers],  # shipping_time
+                    average_other_prices,  # avg_price
+                    situation_sums[situation] / amount_offers,  # avg_price_with_current_offer
+                    numpy.full(len(own_offers), average_sale_price),  # average sale prices
+                    price_differences[0],  # price_diff_to_min
+                    price_differences[2],  # price_diff_to_2nd_min
+                    price_differences[4]  # price_diff_to_3rd_min
+                    ]
+    return numpy.column_stack(columns).astype(float)
+
+
 def __extract_universal_features(offer_id: str, offer_list: List[Offer]):
     current_offer = [x for x in offer_list if offer_id == x.offer_id][0]
     other_offers = [x for x in offer_list if offer_id != x.offer_id]
@@ -55,7 +164,7 @@ def __extract_product_specific_features(offer_id: str, offer_list: List[Offer],
                 int(current_offer.shipping_time['standard']),  # shipping_time
                 __calculate_average_price(other_offers),  # avg_price
                 __calculate_average_price(offer_list),  # avg_price_with_current_offer
-                __calculate_average_price_from_price_list(product_prices.get(current_offer.product_id)),  # average sale prices
+                average_sale_price(product_prices, current_offer.product_id),  # average sale prices
                 price_differences[0],  # price_diff_to_min
                 price_differences[2],  # price_diff_to_2nd_min
                 price_differences[4]  # price_diff_to_3rd_min
@@ -91,6 +200,26 @@ def __calculate_price_differences(current_price, other_offers):
     return result
 
 
+def __calculate_price_differences_for_prices(prices, sorted_other_prices):
+    result = []
+    for i in [0, 1, 2]:
+        if i >= len(sorted_other_prices):
+            result.extend([numpy.zeros(len(prices)), numpy.zeros(len(prices))])
+            continue
+        diffs = __calculate_price_difference_for_prices(prices, sorted_other_prices[i],
+                                                        sorted_other_prices[-1])
+        result.extend(diffs)
+    return result
+
+
+def __calculate_price_difference_for_prices(prices, price2, max_price):
+    diff = prices - price2
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        diff_in_percent = (prices - price2) / (max_price - price2)
+    diff_in_percent = numpy.where(prices <= price2, 0., numpy.where(prices >= max_price, 1., diff_in_percent))
+    return [diff, diff_in_percent]
+
+
 def __calculate_price_difference(price1, price2, max_price):
     diff = price1 - price2
     if price1 <= price2:
@@ -107,6 +236,16 @@ def __calculate_average_price(offers):
     return __calculate_average_price_from_price_list(price_list)
 
 
+def average_sale_price(product_prices: dict, product_id: str):
+    """
+    :param product_prices: product_id -> PriceStatistics or a list of prices
+    """
+    prices = product_prices.get(product_id)
+    if isinstance(prices, PriceStatistics):
+        return prices.average
+    return __calculate_average_price_from_price_list(prices)
+
+
 def __calculate_average_price_from_price_list(price_list: List):
     if price_list and len(price_list) != 0:
         return sum(price_list) / len(price_list)
@@ -0,0 +1,233 @@
+import itertools
+import json
+import os
+import uuid
+
+import numpy
+
+from training_data import TrainingData
+from utils.column_table import Codebook
+from utils.price_statistics import PriceStatistics
+
+MANIFEST = 'manifest.json'
+TABLES = ['situations', 'offers', 'sales']
+CODEBOOKS = ['product_codes', 'merchant_codes', 'offer_codes']
+REFERENCES = {'situation': 'situations', 'offer': 'offer_codes'}  # columns referencing rows that can be evicted
+SCALARS = ['merchant_token', 'merchant_id', 'last_sale_timestamp', 'total_sale_events', 'sales_wo_ms', 'number_marketsituations',
+           'price_half_life', 'export_offsets', 'generation']
+COMPACTION_THRESHOLD = 0.25  # fraction of evicted stored rows above which the remaining rows are merged into one segment
+MAX_SEGMENTS = 64  # segments above which they are merged into one
+
+
+class HistoryStore:
+    """
+    Stores TrainingData in a directory of immutable segments, one per save, and a small manifest:
+
+    manifest.json = { id, next_segment, state: { scalar attributes, product_prices },
+                      segments: [{ segment, rows: { table or codebook: rows }, evicted: { table or codebook: rows }, files }] }
+    <table>.<column>.<segment>.bin  # raw column of the rows added by the segment
+    <codebook>.<segment>.json  # values added by the segment
+    <table or codebook>.evicted.<segment>.bin  # numbers of the stored rows evicted by the segment
+
+    The stored rows are the rows of all segments in order, references to situations and offer codes are stored as
+    stored row numbers. A save writes the rows added and the numbers of the stored rows evicted since the last save to
+    a new segment, so its cost is proportional to the changes. Once more than COMPACTION_THRESHOLD of the stored rows
+    were evicted or there are MAX_SEGMENTS segments, the remaining rows are merged into a single new segment.
+    Segment files are never changed after the manifest listed them, the files of an interrupted save are not listed
+    and removed by the next save.
+
+    Loading maps the column files copy-on-write instead of reading them. A single segment without evicted rows is used
+    without copying, otherwise the segments are concatenated and the remaining rows selected in one vectorized pass.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def exists(self) -> bool:
+        return os.path.isfile(os.path.join(self.directory, MANIFEST))
+
+    def save(self, training_data: TrainingData):
+        """
+        Adds a segment with the changes since the last save of the training data, or merges all rows into a new
+        segment if it was not saved to this store before or too many stored rows were evicted
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = self.__read_manifest() if self.exists() else None
+        evictions = training_data.checkpoint_evictions
+        if manifest is None or training_data.checkpoint != self.__checkpoint(manifest) or self.__needs_compaction(manifest, evictions):
+            manifest = {'id': uuid.uuid4().hex, 'next_segment': manifest['next_segment'] if manifest else 0, 'segments': []}
+            evictions = dict()
+        self.__add_segment(training_data, manifest, evictions)
+        manifest['state'] = self.__get_state(training_data)
+        self.__write_manifest(manifest)
+        self.__remove_unlisted_files(manifest)
+        training_data.checkpoint = self.__checkpoint(manifest)
+        training_data.checkpoint_evictions = dict()
+
+    def load(self) -> TrainingData:
+        manifest = self.__read_manifest()
+        state = manifest['state']
+        training_data = TrainingData(state['merchant_token'], state['merchant_id'])
+        remaining = {name: self.__remaining_rows_mask(manifest, name) for name in TABLES + CODEBOOKS}
+        for table_name in TABLES:
+            table = getattr(training_data, table_name)
+            columns = dict()
+            for column, dtype in [(column, values.dtype) for column, values in table.columns.items()]:
+                values = self.__map_column(manifest, table_name, column, dtype)
+                if remaining[table_name] is not None:
+                    values = values[remaining[table_name]]
+                target = REFERENCES.get(column)
+                if target and remaining[target] is not None:
+                    values = (numpy.cumsum(remaining[target]) - 1)[values].astype(dtype)
+                columns[column] = values
+            table.use_columns(**columns)
+        for codebook_name in CODEBOOKS:
+            values = self.__read_codebook(manifest, codebook_name)
+            if remaining[codebook_name] is not None:
+                values = list(itertools.compress(values, remaining[codebook_name].tolist()))
+            setattr(training_data, codebook_name, Codebook.from_values(values))
+        for key in SCALARS:
+            setattr(training_data, key, state[key])
+        training_data.product_prices = {product_id: self.__create_price_statistics(statistics)
+                                        for product_id, statistics in state['product_prices'].items()}
+        training_data.checkpoint = self.__checkpoint(manifest)
+        training_data.invalidate_indexes()
+        return training_data
+
+    def __add_segment(self, training_data: TrainingData, manifest: dict, evictions: dict):
+        segment = {'segment': manifest['next_segment'], 'rows': dict.fromkeys(TABLES + CODEBOOKS, 0),
+                   'evicted': dict.fromkeys(TABLES + CODEBOOKS, 0), 'files': []}
+        stored_rows = self.__count(manifest, 'rows')
+        evicted_rows = {name: self.__read_evicted_rows(manifest, name) for name in TABLES + CODEBOOKS}
+        for name, evicted in evictions.items():
+            rows = self.__stored_rows(evicted_rows[name], numpy.flatnonzero(evicted))
+            if len(rows) > 0:
+                self.__write_file(segment, '{}.evicted.{:d}.bin'.format(name, segment['segment']), rows.data)
+                evicted_rows[name] = numpy.sort(numpy.concatenate((evicted_rows[name], rows)))
+                segment['evicted'][name] = len(rows)
+        # the rows of the training data before these are stored
+        first_new_rows = {name: stored_rows[name] - len(evicted_rows[name]) for name in TABLES + CODEBOOKS}
+
+        for table_name in TABLES:
+            table = getattr(training_data, table_name)
+            segment['rows'][table_name] = len(table) - first_new_rows[table_name]
+            if segment['rows'][table_name] == 0:
+                continue
+            for column in table.columns:
+                values = table[column][first_new_rows[table_name]:]
+                target = REFERENCES.get(column)
+                if target:
+                    values = self.__to_stored_rows(values, stored_rows[target], first_new_rows[target], evicted_rows[target])
+                self.__write_file(segment, '{}.{}.{:d}.bin'.format(table_name, column, segment['segment']),
+                                  numpy.ascontiguousarray(values, dtype=table[column].dtype).data)
+        for codebook_name in CODEBOOKS:
+            values = getattr(training_data, codebook_name).values[first_new_rows[codebook_name]:]
+            segment['rows'][codebook_name] = len(values)
+            if values:
+                self.__write_file(segment, '{}.{:d}.json'.format(codebook_name, segment['segment']), json.dumps(values).encode())
+        if segment['files']:
+            manifest['segments'].append(segment)
+            manifest['next_segment'] += 1
+
+    def __to_stored_rows(self, rows, stored_rows: int, first_new_row: int, evicted_rows):
+        """
+        :param rows: row numbers in the training data
+        :return: row numbers in the store, the new rows follow the stored rows
+        """
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        stored = rows + (stored_rows - first_new_row)
+        is_stored = rows < first_new_row
+        stored[is_stored] = self.__stored_rows(evicted_rows, rows[is_stored])
+        return stored
+
+    @staticmethod
+    def __stored_rows(evicted_rows, remaining_rows):
+        """
+        :param evicted_rows: sorted numbers of the evicted stored rows
+        :param remaining_rows: positions among the stored rows that were not evicted
+        :return: numbers of these stored rows
+        """
+        return remaining_rows + numpy.searchsorted(evicted_rows - numpy.arange(len(evicted_rows)), remaining_rows, side='right')
+
+    def __write_file(self, segment: dict, file: str, content):
+        with open(os.path.join(self.directory, file), 'wb') as f:
+            f.write(content)
+        segment['files'].append(file)
+
+    def __map_column(self, manifest: dict, table_name: str, column: str, dtype):
+        columns = [numpy.memmap(os.path.join(self.directory, '{}.{}.{:d}.bin'.format(table_name, column, segment['segment'])),
+                                dtype=dtype, mode='c', shape=(segment['rows'][table_name],)).view(numpy.ndarray)
+                   for segment in manifest['segments'] if segment['rows'][table_name] > 0]
+        if len(columns) == 1:
+            return columns[0]
+        return numpy.concatenate(columns) if columns else numpy.zeros(0, dtype=dtype)
+
+    def __read_codebook(self, manifest: dict, codebook_name: str) -> list:
+        values = []
+        for segment in manifest['segments']:
+            if segment['rows'][codebook_name] > 0:
+                with open(os.path.join(self.directory, '{}.{:d}.json'.format(codebook_name, segment['segment'])), 'r') as file:
+                    values.extend(json.load(file))
+        return values
+
+    def __read_evicted_rows(self, manifest: dict, name: str):
+        evicted_rows = [numpy.fromfile(os.path.join(self.directory, '{}.evicted.{:d}.bin'.format(name, segment['segment'])), dtype=numpy.int64)
+                        for segment in manifest['segments'] if segment['evicted'][name] > 0]
+        return numpy.sort(numpy.concatenate(evicted_rows)) if evicted_rows else numpy.zeros(0, dtype=numpy.int64)
+
+    def __remaining_rows_mask(self, manifest: dict, name: str):
+        """
+        :return: mask of the stored rows that were not evicted or None if all remain
+        """
+        evicted_rows = self.__read_evicted_rows(manifest, name)
+        if len(evicted_rows) == 0:
+            return None
+        remaining = numpy.ones(self.__count(manifest, 'rows')[name], dtype=bool)
+        remaining[evicted_rows] = False
+        return remaining
+
+    @staticmethod
+    def __count(manifest: dict, key: str) -> dict:
+        """
+        :param key: 'rows' or 'evicted'
+        :return: table or codebook -> rows of all segments
+        """
+        return {name: sum(segment[key][name] for segment in manifest['segments']) for name in TABLES + CODEBOOKS}
+
+    def __needs_compaction(self, manifest: dict, evictions: dict) -> bool:
+        evicted = sum(self.__count(manifest, 'evicted').values()) + sum(int(numpy.count_nonzero(evicted)) for evicted in evictions.values())
+        return evicted > COMPACTION_THRESHOLD * sum(self.__count(manifest, 'rows').values()) or len(manifest['segments']) >= MAX_SEGMENTS
+
+    def __checkpoint(self, manifest: dict) -> dict:
+        rows, evicted = self.__count(manifest, 'rows'), self.__count(manifest, 'evicted')
+        return {'id': manifest['id'], 'rows': {name: rows[name] - evicted[name] for name in TABLES + CODEBOOKS}}
+
+    @staticmethod
+    def __get_state(training_data: TrainingData) -> dict:
+        state = {key: getattr(training_data, key) for key in SCALARS}
+        state['product_prices'] = {product_id: vars(statistics) for product_id, statistics in training_data.product_prices.items()}
+        return state
+
+    @staticmethod
+    def __create_price_statistics(state: dict) -> PriceStatistics:
+        statistics = PriceStatistics()
+        statistics.__dict__.update(state)
+        return statistics
+
+    def __read_manifest(self) -> dict:
+        with open(os.path.join(self.directory, MANIFEST), 'r') as file:
+            return json.load(file)
+
+    def __write_manifest(self, manifest: dict):
+        # replacing the manifest is atomic, a crash while saving leaves the previous manifest and its segments
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(manifest, file, default=lambda value: value.item())
+        os.replace(path + '.tmp', path)
+
+    def __remove_unlisted_files(self, manifest: dict):
+        listed = {MANIFEST}.union(*(segment['files'] for segment in manifest['segments']))
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name not in listed and os.path.isfile(path):
+                os.remove(path)
@@ -1,15 +1,180 @@
+import io
 import logging
-import os
+import queue
+import tempfile
+from threading import Thread
 
 import requests
 
 from merchant_sdk.api import PricewarsRequester, KafkaApi
 
+TOPICS = ['marketSituation', 'buyOffer']
+BLOCK_SIZE = 1 << 20  # bytes read from the network at once
+BUFFERED_BLOCKS = 8  # blocks a download may be ahead of the ingestion before it waits or spools to disk
+DOWNLOAD_TIMEOUT = (2, 30)  # seconds to connect and between two received blocks
 
-def download_kafka_files(merchant_token, kafka_url):
+
+def download_kafka_files(merchant_token, kafka_url, export_offsets: dict = None):
+    """
+    Starts the downloads of the exports of all topics concurrently. The market situations are ingested first, so the
+    sales are spooled to a temporary file meanwhile instead of waiting for the ingestion.
+    :param export_offsets: topic -> offset of the last download, only the lines appended since are downloaded
+    :return: ExportStream of the market situations and of the sales
+    """
     logging.debug('Downloading files from Kafka ...')
     PricewarsRequester.add_api_token(merchant_token)
     kafka_api = KafkaApi(host=kafka_url)
-    data_url_ms = kafka_api.request_csv_export_for_topic('marketSituation')
-    data_url_bo = kafka_api.request_csv_export_for_topic('buyOffer')
-    return requests.get(data_url_ms, timeout=2), requests.get(data_url_bo, timeout=2)
+    return [ExportStream(kafka_api.request_csv_export_for_topic(topic), (export_offsets or {}).get(topic), spool=topic != TOPICS[0]).start()
+            for topic in TOPICS]
+
+
+class ExportStream(io.RawIOBase):
+    """
+    Readable byte stream of the complete lines of a csv export, starting with the header. The export is downloaded
+    in a background thread that is at most BUFFERED_BLOCKS blocks ahead of the reader.
+
+    The download starts at the last line read from the export before, using a range request. If the server ignores
+    the range or the export does not continue with that line anymore, the complete export is downloaded. A line that
+    is still being written at the end of the export is left out and read again next time. After the stream was read to
+    the end, offset describes the part of the export read so far.
+    """
+
+    def __init__(self, url, offset: dict = None, spool=False):
+        """
+        :param offset: {'offset': bytes read, 'header': header line, 'last_line': last line read} or None
+        :param spool: download the complete export to a temporary file before it is read
+        """
+        super().__init__()
+        self.url = url
+        self.offset = offset
+        self.spool = spool
+        self.blocks = queue.Queue(BUFFERED_BLOCKS)
+        self.error = None
+        self.buffer = b''
+        self.position = 0  # of the first byte in the buffer that was not handed out yet
+        self.end = 0  # of the first byte in the buffer after the last complete line
+        self.finished = False
+        # set by the download before the first block
+        self.header = None
+        self.start_offset = 0  # offset in the export of the first line after the header
+        # handed out lines
+        self.remaining_header = None  # bytes of the header that are still to be handed out
+        self.read_bytes = 0  # bytes handed out after the header
+        self.last_line = b''
+
+    def start(self):
+        Thread(target=self.__download, daemon=True).start()
+        return self
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self.finished and self.end <= self.position:
+            block = self.blocks.get()
+            if self.error:
+                raise IOError('Download of {} failed: {}'.format(self.url, self.error))
+            if block is None:
+                self.finished = True
+                self.__update_offset()
+            else:
+                self.buffer = self.buffer[self.position:] + block
+                self.position = 0
+                self.end = self.buffer.rfind(b'\n') + 1
+        lines = self.buffer[self.position:min(self.end, self.position + len(target))]
+        if not lines:
+            return 0
+        self.position += len(lines)
+        target[:len(lines)] = lines
+        self.__count(lines)
+        return len(lines)
+
+    def __count(self, lines: bytes):
+        if self.remaining_header is None:
+            self.remaining_header = len(self.header.encode()) + 1
+        header_bytes = min(len(lines), self.remaining_header)
+        self.remaining_header -= header_bytes
+        lines = lines[header_bytes:]
+        self.read_bytes += len(lines)
+        tail = self.last_line + lines
+        self.last_line = tail[tail.rfind(b'\n', 0, len(tail) - 1) + 1:]
+
+    def __update_offset(self):
+        if self.header is None:
+            return
+        if self.read_bytes > 0:
+            self.offset = {'offset': self.start_offset + self.read_bytes, 'header': self.header, 'last_line': self.last_line[:-1].decode()}
+        elif self.offset is None or self.offset['offset'] != self.start_offset:
+            self.offset = {'offset': self.start_offset, 'header': self.header, 'last_line': self.header}
+
+    def __download(self):
+        try:
+            blocks = self.__download_blocks()
+            if self.spool:
+                blocks = self.__spool(blocks)
+            for block in blocks:
+                if not self.__put(block):
+                    return
+        except Exception as e:
+            self.error = e
+        self.__put(None)
+
+    def __put(self, block):
+        """
+        Waits until the reader took enough blocks or closed the stream
+        :return: False if the stream was closed
+        """
+        while not self.closed:
+            try:
+                self.blocks.put(block, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __download_blocks(self):
+        if self.offset:
+            overlap = (self.offset['last_line'] + '\n').encode()
+            response = requests.get(self.url, headers={'Range': 'bytes={}-'.format(self.offset['offset'] - len(overlap))}, stream=True,
+                                    timeout=DOWNLOAD_TIMEOUT)
+            if response.status_code == 206:
+                blocks = response.iter_content(BLOCK_SIZE)
+                first_block = self.__read_until(blocks, lambda content: len(content) >= len(overlap))
+                if first_block.startswith(overlap):
+                    self.header, self.start_offset = self.offset['header'], self.offset['offset']
+                    yield (self.header + '\n').encode()
+                    yield first_block[len(overlap):]
+                    yield from blocks
+                    return
+            if response.status_code != 200:
+                response.close()
+                response = requests.get(self.url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        else:
+            response = requests.get(self.url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        if response.status_code != 200:
+            raise IOError('status code {:d}'.format(response.status_code))
+        blocks = response.iter_content(BLOCK_SIZE)
+        first_block = self.__read_until(blocks, lambda content: b'\n' in content)
+        if b'\n' not in first_block:
+            raise IOError('the export has no header')
+        self.header = first_block.split(b'\n', 1)[0].decode()
+        self.start_offset = len(self.header.encode()) + 1
+        yield first_block
+        yield from blocks
+
+    @staticmethod
+    def __read_until(blocks, condition):
+        content = b''
+        for block in blocks:
+            content += block
+            if condition(content):
+                break
+        return content
+
+    @staticmethod
+    def __spool(blocks):
+        with tempfile.SpooledTemporaryFile(max_size=BUFFERED_BLOCKS * BLOCK_SIZE) as file:
+            for block in blocks:
+                file.write(block)
+            file.seek(0)
+            yield from iter(lambda: file.read(BLOCK_SIZE), b'')
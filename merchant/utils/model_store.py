@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+
+import sklearn
+
+from ml_engine import MlEngine
+
+MANIFEST = 'manifest.json'
+
+
+class ModelStore:
+    """
+    Stores the trained models of an MlEngine in a directory of versions and a small manifest:
+
+    manifest.json = { version, engine, sklearn_version, watermark, products: { product_id: file } }
+    version_<n>/product_<i>.pkl  # one pickled model per product
+    version_<n>/universal.pkl
+
+    The watermark of the TrainingData the models were trained on is stored with them, so a restarted merchant can
+    serve the saved models immediately and only retrain them if new data arrived.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def exists(self) -> bool:
+        return os.path.isfile(os.path.join(self.directory, MANIFEST))
+
+    def save(self, ml_engine: MlEngine, watermark: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        number = self.__read_manifest()['version'] + 1 if self.exists() else 0
+        version = 'version_{:d}'.format(number)
+        os.makedirs(os.path.join(self.directory, version), exist_ok=True)
+        # copy the dict, the models can be replaced by a concurrent training meanwhile
+        product_models = dict(ml_engine.product_model_dict)
+        products = dict()
+        for i, (product_id, product_model) in enumerate(product_models.items()):
+            products[product_id] = 'product_{:d}.pkl'.format(i)
+            self.__dump(product_model, version, products[product_id])
+        self.__dump(ml_engine.universal_model, version, 'universal.pkl')
+        self.__write_manifest({'version': number, 'engine': type(ml_engine).__name__, 'sklearn_version': sklearn.__version__,
+                               'watermark': watermark, 'products': products})
+        self.__remove_other_versions(version)
+
+    def load(self, ml_engine: MlEngine):
+        """
+        Restores the saved models if they were trained by the same kind of engine and sklearn version
+        :return: watermark of the training data of the models or None if no models were restored
+        """
+        if not self.exists():
+            return None
+        manifest = self.__read_manifest()
+        if manifest['engine'] != type(ml_engine).__name__ or manifest['sklearn_version'] != sklearn.__version__:
+            logging.warning('Saved models of {} with sklearn {} are ignored'.format(manifest['engine'], manifest['sklearn_version']))
+            return None
+        version = 'version_{:d}'.format(manifest['version'])
+        product_models = {product_id: self.__load(version, file) for product_id, file in manifest['products'].items()}
+        ml_engine.restore_models(product_models, self.__load(version, 'universal.pkl'))
+        return manifest['watermark']
+
+    def __dump(self, model, version: str, file: str):
+        with open(os.path.join(self.directory, version, file), 'wb') as m:
+            pickle.dump(model, m)
+
+    def __load(self, version: str, file: str):
+        with open(os.path.join(self.directory, version, file), 'rb') as m:
+            return pickle.load(m)
+
+    def __read_manifest(self) -> dict:
+        with open(os.path.join(self.directory, MANIFEST), 'r') as file:
+            return json.load(file)
+
+    def __write_manifest(self, manifest: dict):
+        # replacing the manifest is atomic, a crash while saving leaves the previous manifest and its version
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(manifest, file)
+        os.replace(path + '.tmp', path)
+
+    def __remove_other_versions(self, version: str):
+        for name in os.listdir(self.directory):
+            if name.startswith('version_') and name != version:
+                shutil.rmtree(os.path.join(self.directory, name))
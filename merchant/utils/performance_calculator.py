@@ -2,18 +2,17 @@ import logging
 import math
 import sys
 import traceback
+from collections import Counter
 from typing import List
 
 import numpy
 
 from ml_engine import MlEngine
 from training_data import TrainingData
-from utils.feature_extractor import extract_features
+from utils.feature_extractor import extract_features, NUM_OF_UNIVERSAL_FEATURES, NUM_OF_PRODUCT_SPECIFIC_FEATURES
 
 CALCULATE_PRODUCT_SPECIFIC_PERFORMANCE = False
 CALCULATE_UNIVERSAL_PERFORMANCE = False
-NUM_OF_UNIVERSAL_FEATURES = 5
-NUM_OF_PRODUCT_SPECIFIC_FEATURES = 14
 
 
 class PerformanceCalculator:
@@ -31,22 +30,20 @@ class PerformanceCalculator:
         sales_probabilities_uni = []
         sales_uni = []
 
-        for joined_market_situations in training_data.joined_data.values():
-            for jms in joined_market_situations.values():
-                if merchant_id in jms.merchants:
-                    for offer_id in jms.merchants[merchant_id].keys():
-                        amount_sales = TrainingData.extract_sales(jms.merchants[merchant_id][offer_id].product_id, offer_id, jms.sales)
-                        if CALCULATE_PRODUCT_SPECIFIC_PERFORMANCE:
-                            features_ps = extract_features(offer_id, TrainingData.create_offer_list(jms), False, training_data.product_prices)
-                        if CALCULATE_UNIVERSAL_PERFORMANCE:
-                            features_uni = extract_features(offer_id, TrainingData.create_offer_list(jms), True, training_data.product_prices)
-                        if amount_sales == 0:
-                            self.__add_product_specific_probabilities(features_ps, jms, offer_id, sales_probabilities_ps, sales_ps, 0, probability_per_offer)
-                            self.__add_universal_probabilities(features_uni, sales_probabilities_uni, sales_uni, 0)
-                        else:
-                            for i in range(amount_sales):
-                                self.__add_product_specific_probabilities(features_ps, jms, offer_id, sales_probabilities_ps, sales_ps, 1, probability_per_offer)
-                                self.__add_universal_probabilities(features_uni, sales_probabilities_uni, sales_uni, 1)
+        for product_id, timestamp, jms in training_data.iterate_joined_market_situations():
+            if merchant_id in jms.merchants:
+                sales_per_offer = Counter(offer_id for _, offer_id in jms.sales)
+                for offer_id in jms.merchants[merchant_id].keys():
+                    amount_sales = sales_per_offer[offer_id]
+                    features_ps = extract_features(offer_id, TrainingData.create_offer_list(jms), False, training_data.product_prices)
+                    features_uni = features_ps[:NUM_OF_UNIVERSAL_FEATURES]
+                    if amount_sales == 0:
+                        self.__add_product_specific_probabilities(features_ps, jms, offer_id, sales_probabilities_ps, sales_ps, 0, probability_per_offer)
+                        self.__add_universal_probabilities(features_uni, sales_probabilities_uni, sales_uni, 0)
+                    else:
+                        for i in range(amount_sales):
+                            self.__add_product_specific_probabilities(features_ps, jms, offer_id, sales_probabilities_ps, sales_ps, 1, probability_per_offer)
+                            self.__add_universal_probabilities(features_uni, sales_probabilities_uni, sales_uni, 1)
         if CALCULATE_PRODUCT_SPECIFIC_PERFORMANCE:
             self.__process_performance_calculation(sales_probabilities_ps, sales_ps, NUM_OF_PRODUCT_SPECIFIC_FEATURES, "Product-specific")
         if CALCULATE_UNIVERSAL_PERFORMANCE:
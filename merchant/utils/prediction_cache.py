@@ -0,0 +1,66 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from typing import List
+
+from merchant_sdk.models import Offer
+
+CachedPrice = namedtuple('CachedPrice', ['best_price', 'evaluated_prices', 'expected_profits'])
+
+
+class PredictionCache:
+    """
+    Least recently used cache of optimal prices, keyed by the fingerprint of the market situation of an offer
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def fingerprint(own_offer: Offer, current_offers: List[Offer], price: float, average_sale_price: float, model_version: int):
+        """
+        :param average_sale_price: feature of the product, it changes with new sales before the models are retrained
+        """
+        competitors = tuple(sorted((float(offer.price), int(offer.quality), int(offer.shipping_time['standard']))
+                                   for offer in current_offers if offer.offer_id != own_offer.offer_id))
+        return (str(own_offer.product_id), int(own_offer.quality), int(own_offer.shipping_time['standard']),
+                competitors, float(price), float(average_sale_price), model_version)
+
+    def get(self, key):
+        with self.lock:
+            cached_price = self.entries.get(key)
+            if cached_price is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return cached_price
+
+    def peek(self, key):
+        """
+        Looks up a cached price without counting the lookup or marking the entry as recently used
+        """
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, best_price: float, evaluated_prices: List[float], expected_profits: List[float]):
+        with self.lock:
+            self.entries[key] = CachedPrice(best_price, evaluated_prices, expected_profits)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self.entries)
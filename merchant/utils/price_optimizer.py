@@ -0,0 +1,98 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+from numpy import argsort, linspace
+
+from utils.prices import PriceUtils
+
+
+class PriceOptimizer(ABC):
+    """
+    Searches the most profitable price of an offer in rounds. Every round the merchant predicts the expected
+    profits of the returned prices, the search ends as soon as no new prices are returned.
+    """
+
+    def __init__(self):
+        self.priceutils = PriceUtils()
+
+    @abstractmethod
+    def initial_prices(self, price: float, competitor_prices: List[float]) -> List[float]:
+        pass
+
+    @abstractmethod
+    def next_prices(self, price: float, evaluated_prices: List[float], expected_profits: List[float], search_round: int) -> List[float]:
+        pass
+
+
+class GridPriceOptimizer(PriceOptimizer):
+    def __init__(self, use_random_distance=False):
+        super().__init__()
+        self.use_random_distance = use_random_distance
+
+    def initial_prices(self, price: float, competitor_prices: List[float]):
+        return self.priceutils.get_potential_prices(price, self.use_random_distance)
+
+    def next_prices(self, price: float, evaluated_prices: List[float], expected_profits: List[float], search_round: int):
+        return []
+
+
+class BreakpointPriceOptimizer(PriceOptimizer):
+    def initial_prices(self, price: float, competitor_prices: List[float]):
+        return self.priceutils.get_breakpoint_prices(price, competitor_prices)
+
+    def next_prices(self, price: float, evaluated_prices: List[float], expected_profits: List[float], search_round: int):
+        if search_round > 1:
+            return []
+        return self.priceutils.get_refined_prices(evaluated_prices, expected_profits)
+
+
+class CoarseToFinePriceOptimizer(PriceOptimizer):
+    """
+    Sweeps the whole price range coarsely and refines recursively around the top_k most profitable prices
+    until max_evaluations prices have been predicted or the prices are one cent apart
+    """
+
+    def __init__(self, max_evaluations=60, top_k=3):
+        super().__init__()
+        self.max_evaluations = max(max_evaluations, 3)
+        self.top_k = top_k
+
+    def initial_prices(self, price: float, competitor_prices: List[float]):
+        coarse_amount = max(self.max_evaluations // 3, 3)
+        return sorted({round(potential_price, 2) for potential_price in linspace(price * 0.9, price * 3, coarse_amount)})
+
+    def next_prices(self, price: float, evaluated_prices: List[float], expected_profits: List[float], search_round: int):
+        remaining_evaluations = self.max_evaluations - len(evaluated_prices)
+        if remaining_evaluations <= 0:
+            return []
+
+        order = argsort(evaluated_prices)
+        sorted_prices = [evaluated_prices[i] for i in order]
+        sorted_profits = [expected_profits[i] for i in order]
+        best_indices = sorted(range(len(sorted_profits)), key=lambda i: sorted_profits[i], reverse=True)[:self.top_k]
+        amount_per_interval = max(remaining_evaluations // (2 * len(best_indices)), 1)
+
+        next_prices = set()
+        for index in best_indices:
+            for neighbour in [index - 1, index + 1]:
+                if 0 <= neighbour < len(sorted_prices):
+                    lower_price, upper_price = sorted(
+                        [sorted_prices[index], sorted_prices[neighbour]])
+                    next_prices.update(self.__prices_between(lower_price, upper_price, amount_per_interval))
+        next_prices.difference_update(evaluated_prices)
+        return sorted(next_prices)[:remaining_evaluations]
+
+    @staticmethod
+    def __prices_between(lower_price: float, upper_price: float, amount: int):
+        amount = min(amount, int(round((upper_price - lower_price) * 100)) - 1)
+        if amount <= 0:
+            return []
+        return [round(potential_price, 2) for potential_price in linspace(lower_price, upper_price, amount + 2)[1:-1]]
+
+
+def create_price_optimizer(settings: dict) -> PriceOptimizer:
+    if settings["price_search"] == 'breakpoints':
+        return BreakpointPriceOptimizer()
+    elif settings["price_search"] == 'coarse_to_fine':
+        return CoarseToFinePriceOptimizer(settings["max_price_evaluations"])
+    return GridPriceOptimizer(settings["price_search"] == 'random')
@@ -0,0 +1,64 @@
+import numpy
+
+MILLISECONDS_PER_MINUTE = 60000
+
+
+class PriceStatistics:
+    """
+    Running count and sum of the sale prices of a product. With a half life, the weight of a price also halves
+    every half_life minutes and the average is the time-decayed mean.
+    """
+
+    def __init__(self, half_life: float = 0.0):
+        self.half_life = half_life  # minutes, 0 averages all prices equally
+        self.count = 0
+        self.total = 0.0
+        self.decayed_count = 0.0
+        self.decayed_total = 0.0
+        self.timestamp = None  # epoch milliseconds the decayed sums refer to
+
+    @staticmethod
+    def from_prices(prices, half_life: float = 0.0):
+        statistics = PriceStatistics(half_life)
+        for price in prices:
+            statistics.add(price)
+        return statistics
+
+    def add(self, price: float, timestamp: int = None):
+        self.count += 1
+        self.total += price
+        weight = 1.0
+        if timestamp is not None and self.timestamp is not None and timestamp < self.timestamp:
+            weight = float(self.__decay(self.timestamp - timestamp))
+        elif timestamp is not None:
+            if self.timestamp is not None:
+                decay = float(self.__decay(timestamp - self.timestamp))
+                self.decayed_count *= decay
+                self.decayed_total *= decay
+            self.timestamp = timestamp
+        self.decayed_count += weight
+        self.decayed_total += weight * price
+
+    def remove(self, prices, timestamps):
+        """
+        Removes the given sales, e.g. when they are evicted from the training data
+        """
+        prices, timestamps = numpy.asarray(prices, dtype=float), numpy.asarray(timestamps, dtype=numpy.int64)
+        self.count = max(0, self.count - len(prices))
+        self.total -= float(prices.sum())
+        weights = self.__decay(self.timestamp - timestamps) if self.timestamp is not None else numpy.ones(len(prices))
+        self.decayed_count -= float(weights.sum())
+        self.decayed_total -= float((weights * prices).sum())
+        if self.count == 0:
+            self.total = self.decayed_count = self.decayed_total = 0.0
+
+    @property
+    def average(self) -> float:
+        if self.half_life > 0 and self.decayed_count > 0:
+            return self.decayed_total / self.decayed_count
+        return self.total / self.count if self.count > 0 else 0
+
+    def __decay(self, milliseconds):
+        if self.half_life <= 0:
+            return numpy.ones_like(milliseconds, dtype=float)
+        return numpy.power(0.5, numpy.maximum(milliseconds, 0) / (self.half_life * MILLISECONDS_PER_MINUTE))
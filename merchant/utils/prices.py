@@ -1,7 +1,7 @@
 import random
 from typing import List
 
-from numpy import arange
+from numpy import arange, argmax, linspace
 
 
 class PriceUtils:
@@ -17,6 +17,34 @@ class PriceUtils:
         else:
             return self.__get_potential_prices_with_fixed_distance(price)
 
+    def get_breakpoint_prices(self, price, competitor_prices: List[float]):
+        """
+        Features only change their character at the prices of the competitors, so it is sufficient to
+        evaluate the prices just below and at every competitor price within the range of potential prices
+        """
+        lowest_price = round(price * 0.9, 2)
+        highest_price = round(price * 3, 2)
+
+        potential_prices = {lowest_price, highest_price}
+        for competitor_price in competitor_prices:
+            for potential_price in [round(float(competitor_price) - 0.01, 2), round(float(competitor_price), 2)]:
+                if lowest_price <= potential_price <= highest_price:
+                    potential_prices.add(potential_price)
+        return sorted(potential_prices)
+
+    def get_refined_prices(self, potential_prices: List[float], expected_profits: List[float], max_amount=20):
+        """
+        Returns prices between the neighbours of the most profitable potential price, potential_prices have to be sorted
+        """
+        best_index = int(argmax(expected_profits))
+        lower_price = potential_prices[max(best_index - 1, 0)]
+        upper_price = potential_prices[min(best_index + 1, len(potential_prices) - 1)]
+
+        refined_prices = arange(lower_price + 0.05, upper_price, 0.05)
+        if len(refined_prices) > max_amount:
+            refined_prices = linspace(lower_price, upper_price, max_amount + 2)[1:-1]
+        return [round(refined_price, 2) for refined_price in refined_prices if round(refined_price, 2) not in potential_prices]
+
     def __get_potential_prices_with_random_distance(self, price):
         min_difference = 1  # in cent
         max_difference = 50  # in cent
@@ -0,0 +1,46 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy
+
+SHARED_MEMORY_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') else None  # the default temporary directory otherwise
+
+
+def create_training_pool(workers: int) -> ProcessPoolExecutor:
+    # worker processes are started by a fork server, forking the merchant itself is unsafe while its threads run
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('forkserver'))
+
+
+def fit_in_processes(pool: ProcessPoolExecutor, fit, models: dict, features: dict):
+    """
+    Fits the models on the worker processes of the pool. The training data of all products is written once to a
+    memory-mapped file in shared memory that the workers map instead of receiving pickled copies of the arrays.
+    :param fit: picklable function fitting a model with features, sales and weights
+    :param models: product_id -> unfitted model
+    :param features: product_id -> (features, sales, weights)
+    :return: generator of (product_id, fitted model) in the order the fits finish
+    """
+    with tempfile.NamedTemporaryFile(dir=SHARED_MEMORY_DIRECTORY, prefix='training_data_') as file:
+        layouts = dict()
+        for product_id, arrays in features.items():
+            layouts[product_id] = []
+            for array in arrays:
+                array = numpy.ascontiguousarray(array)
+                layouts[product_id].append((file.tell(), array.dtype.str, array.shape))
+                file.write(array.data)
+        file.flush()
+        futures = {pool.submit(fit_shared, fit, models[product_id], file.name, layouts[product_id]): product_id for product_id in features}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def fit_shared(fit, model, path: str, layout: list):
+    """
+    Runs on a worker process
+    :param layout: (offset, dtype, shape) of the features, sales and weights in the file
+    """
+    arrays = [numpy.memmap(path, dtype=numpy.dtype(dtype), mode='r', offset=offset, shape=shape) if numpy.prod(shape) > 0
+              else numpy.zeros(shape, dtype=dtype) for offset, dtype, shape in layout]
+    return fit(model, *arrays)
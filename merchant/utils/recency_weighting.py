@@ -0,0 +1,26 @@
+from functools import partial
+
+import numpy
+
+
+def step_weights(minutes):
+    """
+    Market situations of the last 10 minutes weigh 3 times, of the last hour 2 times as much as older ones
+    :param minutes: age of the market situations in minutes
+    """
+    minutes = numpy.asarray(minutes, dtype=float)
+    return numpy.where(minutes < 10, 3., numpy.where(minutes < 60, 2., 1.))
+
+
+def exponential_weights(minutes, half_life=60.0):
+    """
+    The weight of a market situation halves every half_life minutes, the latest one weighs 1
+    :param minutes: age of the market situations in minutes
+    """
+    return numpy.power(0.5, numpy.asarray(minutes, dtype=float) / half_life)
+
+
+def create_recency_weighting(settings: dict):
+    if settings["recency_weighting"] == 'exponential':
+        return partial(exponential_weights, half_life=settings["recency_half_life"])
+    return step_weights
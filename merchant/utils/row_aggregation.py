@@ -0,0 +1,14 @@
+import numpy
+
+
+def aggregate_identical_rows(features, sales, weights):
+    """
+    Collapses training rows with identical features and sale into one row that carries the sum of their weights
+    :return: unique features, sales and weights
+    """
+    if len(sales) == 0:
+        return features, sales, weights
+    rows = numpy.column_stack((features, sales))
+    unique_rows, inverse = numpy.unique(rows, axis=0, return_inverse=True)
+    aggregated_weights = numpy.bincount(inverse.ravel(), weights=weights, minlength=len(unique_rows))
+    return unique_rows[:, :-1], unique_rows[:, -1].astype(numpy.asarray(sales).dtype), aggregated_weights
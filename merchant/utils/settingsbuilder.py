@@ -25,6 +25,19 @@ class SettingsBuilder:
         self.settings["underprice"] = 0.2
         self.settings["initialProducts"] = 5
         self.settings["min_marketsituations"] = 50
+        self.settings["price_search"] = 'fixed'  # fixed, random, breakpoints or coarse_to_fine
+        self.settings["max_price_evaluations"] = 60  # per offer, only used by coarse_to_fine
+        self.settings["prediction_cache_size"] = 1000
+        self.settings["pricing_deadline"] = 0.0  # seconds per tick for pricing existing offers, 0 disables the deadline
+        self.settings["recency_weighting"] = 'steps'  # steps or exponential
+        self.settings["recency_half_life"] = 60.0  # minutes, only used by exponential
+        self.settings["aggregate_training_rows"] = True
+        self.settings["retention_minutes"] = 0.0  # age of the oldest kept market situations, 0 keeps all
+        self.settings["max_situations_per_product"] = 0  # 0 keeps all
+        self.settings["average_price_half_life"] = 0.0  # minutes, 0 averages all sale prices equally
+        self.settings["incremental_kafka_refresh"] = True  # only download the new part of the kafka exports
+        self.settings["training_backend"] = 'threads'  # threads or processes
+        self.settings["training_workers"] = 8  # product models trained in parallel
         self.settings["market_situation_csv_path"] = '../data/marketSituation.csv'
         self.settings["buy_offer_csv_path"] = '../data/buyOffer.csv'
         self.settings["initial_merchant_id"] = 'DaywOe3qbtT3C8wBBSV+zBOH55DVz40L6PH1/1p9xCM='
@@ -1,7 +1,45 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy
+import pandas
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+MILLISECONDS_PER_DAY = 86400000
 
 
 class TimestampConverter:
     @staticmethod
     def from_string(timestamp):
         return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def to_epoch_ms(timestamp: str) -> int:
+        """
+        Parses timestamps of the fixed format 2017-05-30T06:00:13.776Z to epoch milliseconds without strptime,
+        other formats are parsed by from_string. All offers of a market situation share their timestamp, so the
+        latest timestamps are cached.
+        """
+        if len(timestamp) < 22 or timestamp[10] != 'T' or timestamp[19] != '.' or timestamp[-1] != 'Z':
+            return (TimestampConverter.from_string(timestamp) - EPOCH) // timedelta(milliseconds=1)
+        return TimestampConverter.__day_to_epoch_ms(timestamp[:10]) + int(timestamp[11:13]) * 3600000 + int(timestamp[14:16]) * 60000 \
+            + int(timestamp[17:19]) * 1000 + int((timestamp[20:-1] + '00')[:3])
+
+    @staticmethod
+    def to_epoch_ms_array(timestamps) -> numpy.ndarray:
+        """
+        Parses an array of timestamps, every distinct timestamp is parsed once
+        """
+        codes, distinct_timestamps = pandas.factorize(numpy.asarray(timestamps, dtype=object))
+        return numpy.array([TimestampConverter.to_epoch_ms(timestamp) for timestamp in distinct_timestamps], dtype=numpy.int64)[codes]
+
+    @staticmethod
+    def to_string(epoch_ms: int) -> str:
+        return (EPOCH + timedelta(milliseconds=int(epoch_ms))).strftime('%Y-%m-%dT%H:%M:%S.') + '{:03d}Z'.format(int(epoch_ms) % 1000)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def __day_to_epoch_ms(day: str) -> int:
+        return (date(int(day[0:4]), int(day[5:7]), int(day[8:10])).toordinal() - EPOCH_ORDINAL) * MILLISECONDS_PER_DAY
@@ -1,5 +1,11 @@
+import csv
 import pickle
 
+import pandas
+
+CSV_CHUNK_SIZE = 100000  # lines parsed at once by read_csv_chunks
+ID_DTYPES = dict.fromkeys(['consumer_id', 'merchant_id', 'offer_id', 'product_id', 'timestamp', 'triggering_merchant_id', 'uid'], str)
+
 
 def load_history(file):
     with open(file, 'rb') as m:
@@ -25,3 +31,20 @@ def get_market_situation_fieldnames():
     return ['amount', 'merchant_id', 'offer_id', 'price', 'prime', 'product_id',
             'quality', 'shipping_time_prime', 'shipping_time_standard', 'timestamp',
             'triggering_merchant_id', 'uid']
+
+
+def read_csv_chunks(file, fieldnames, dtype=str, chunk_size=CSV_CHUNK_SIZE, has_header=None):
+    """
+    Reads a csv file with or without header in DataFrames of at most chunk_size lines
+    :param file: path or text buffer
+    :param dtype: type of all columns or dict of column types, pass ID_DTYPES to parse all but the ids as numbers
+    :param has_header: None detects whether the file has a header
+    """
+    if has_header is None and isinstance(file, str):
+        with open(file, 'r') as csvfile:
+            has_header = csv.Sniffer().has_header(csvfile.read(16384))
+    elif has_header is None:
+        has_header = csv.Sniffer().has_header(file.read(16384))
+        file.seek(0)
+    return pandas.read_csv(file, header=0 if has_header else None, names=None if has_header else fieldnames, dtype=dtype,
+                           keep_default_na=False, chunksize=chunk_size)